@@ -3,29 +3,110 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 from datetime import timedelta
 import os
+import threading
 
 jwt = JWTManager()
 
+def engine_options_from_env():
+    """SQLAlchemy engine/pool options, each overridable from the environment"""
+    options = {'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'}
+    for key, env, cast in [
+        ('pool_size', 'DB_POOL_SIZE', int),
+        ('max_overflow', 'DB_MAX_OVERFLOW', int),
+        ('pool_timeout', 'DB_POOL_TIMEOUT', float),
+        ('pool_recycle', 'DB_POOL_RECYCLE', int),
+    ]:
+        if os.getenv(env):
+            options[key] = cast(os.getenv(env))
+    return options
+
 def create_app():
     app = Flask(__name__)
-    CORS(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
     
     # Configuration
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ai_tutor.db'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///ai_tutor.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env()
+    
+    # SQLite connection pragmas (ignored for other databases)
+    app.config['SQLITE_JOURNAL_MODE'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 30000))
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
     app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-in-production'
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
     app.config['UPLOAD_FOLDER'] = 'uploads'
     app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
     
+    # Zip upload limits (uncompressed sizes)
+    app.config['ZIP_MAX_TOTAL_BYTES'] = int(os.getenv('ZIP_MAX_TOTAL_BYTES', 2 * 1024 * 1024 * 1024))
+    app.config['ZIP_MAX_MEMBER_BYTES'] = int(os.getenv('ZIP_MAX_MEMBER_BYTES', 500 * 1024 * 1024))
+    app.config['ZIP_MAX_RATIO'] = int(os.getenv('ZIP_MAX_RATIO', 100))
+    app.config['ZIP_MAX_MEMBERS'] = int(os.getenv('ZIP_MAX_MEMBERS', 2000))
+    
+    # Resumable (chunked) uploads
+    app.config['RESUMABLE_UPLOAD_MAX_BYTES'] = int(os.getenv('RESUMABLE_UPLOAD_MAX_BYTES', 5 * 1024 * 1024 * 1024))
+    app.config['RESUMABLE_UPLOAD_CHUNK_SIZE'] = int(os.getenv('RESUMABLE_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+    # Seconds without a chunk before an upload session and its partial file are deleted
+    app.config['UPLOAD_SESSION_TTL'] = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 3600))
+    
+    # Generate every lesson's initial components during module processing
+    app.config['PREGENERATE_LESSONS'] = os.getenv('PREGENERATE_LESSONS', 'false').lower() == 'true'
+    
+    # Background job queue
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+    # Run job workers inside the web process; set to false when jobs run in
+    # separate `python worker.py` processes
+    app.config['RUN_JOB_WORKERS'] = os.getenv('RUN_JOB_WORKERS', 'true').lower() == 'true'
+    app.config['JOB_VISIBILITY_TIMEOUT'] = int(os.getenv('JOB_VISIBILITY_TIMEOUT', 600))
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    app.config['JOB_BACKOFF_BASE'] = int(os.getenv('JOB_BACKOFF_BASE', 30))
+    # Comma-separated usernames allowed to read queue-wide data (/api/jobs/metrics)
+    app.config['ADMIN_USERNAMES'] = {name.strip() for name in os.getenv('ADMIN_USERNAMES', '').split(',') if name.strip()}
+    # Seconds between runs of periodic cleanup jobs (e.g. expiring abandoned uploads)
+    app.config['JOB_MAINTENANCE_INTERVAL'] = float(os.getenv('JOB_MAINTENANCE_INTERVAL', 3600))
+    
+    # Seconds between progress writes to the module row (the progress store gets every update)
+    app.config['PROGRESS_FLUSH_INTERVAL'] = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 5))
+    
+    # Module list pagination
+    app.config['MODULES_PAGE_SIZE'] = int(os.getenv('MODULES_PAGE_SIZE', 50))
+    app.config['MODULES_MAX_PAGE_SIZE'] = int(os.getenv('MODULES_MAX_PAGE_SIZE', 200))
+    
+    # Largest event array accepted by /api/telemetry/batch
+    app.config['TELEMETRY_MAX_BATCH'] = int(os.getenv('TELEMETRY_MAX_BATCH', 500))
+    
+    # Write-behind telemetry buffer; a flush interval of 0 writes every event immediately
+    app.config['TELEMETRY_FLUSH_INTERVAL'] = float(os.getenv('TELEMETRY_FLUSH_INTERVAL', 2))
+    app.config['TELEMETRY_FLUSH_SIZE'] = int(os.getenv('TELEMETRY_FLUSH_SIZE', 200))
+    app.config['TELEMETRY_BUFFER_MAX'] = int(os.getenv('TELEMETRY_BUFFER_MAX', 5000))
+    app.config['TELEMETRY_SPILL_FOLDER'] = os.getenv('TELEMETRY_SPILL_FOLDER', './telemetry_spool')
+    
+    # Server-sent progress events. Each open stream occupies a server thread (or
+    # gunicorn sync worker) for up to SSE_MAX_STREAM_SECONDS before the browser
+    # reconnects, so size the server for SSE_MAX_STREAMS_PER_USER x active users.
+    app.config['SSE_POLL_INTERVAL'] = float(os.getenv('SSE_POLL_INTERVAL', 0.5))
+    app.config['SSE_HEARTBEAT_SECONDS'] = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+    app.config['SSE_MAX_STREAM_SECONDS'] = int(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+    app.config['SSE_MAX_STREAMS_PER_USER'] = int(os.getenv('SSE_MAX_STREAMS_PER_USER', 3))
+    app.config['SSE_TOKEN_SECONDS'] = int(os.getenv('SSE_TOKEN_SECONDS', 900))
+    
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     # Initialize extensions
-    from models import db
+    from models import db, configure_sqlite
     db.init_app(app)
     jwt.init_app(app)
     
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
+    
+    from services.job_queue import job_queue
+    job_queue.init_app(app)
+    
     # JWT error handlers
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
@@ -48,16 +129,24 @@ def create_app():
         db.create_all()
         print("✓ Database initialized successfully")
     
+    # After create_all: starting the buffer replays spilled events into the tables
+    from services.telemetry_buffer import telemetry_buffer
+    telemetry_buffer.init_app(app)
+    
     # Register blueprints
     from routes.auth import auth_bp
     from routes.modules import modules_bp
     from routes.lessons import lessons_bp
     from routes.telemetry import telemetry_bp
+    from routes.uploads import uploads_bp
+    from routes.jobs import jobs_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(modules_bp, url_prefix='/api/modules')
     app.register_blueprint(lessons_bp, url_prefix='/api/lesson')
     app.register_blueprint(telemetry_bp, url_prefix='/api/telemetry')
+    app.register_blueprint(uploads_bp, url_prefix='/api/uploads')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
     
     print("✓ All routes registered successfully")
     
@@ -78,6 +167,26 @@ def create_app():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
     
+    # Job workers start with the first request, so only processes that serve
+    # requests run them: not the debug reloader's watcher process, not scripts
+    # that call create_app(), and under gunicorn each worker after the fork.
+    if app.config['RUN_JOB_WORKERS']:
+        workers_started = threading.Event()
+        workers_lock = threading.Lock()
+        
+        @app.before_request
+        def start_job_workers():
+            if workers_started.is_set():
+                return
+            with workers_lock:
+                if workers_started.is_set():
+                    return
+                from routes.modules import resume_interrupted_modules
+                from services.job_queue import WorkerPool
+                resume_interrupted_modules(app)
+                WorkerPool(app, app.config['JOB_WORKERS'], app.config['JOB_POLL_INTERVAL']).start()
+                workers_started.set()
+    
     # Request logging middleware
     @app.before_request
     def log_request():
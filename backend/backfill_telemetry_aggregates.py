@@ -0,0 +1,44 @@
+"""
+Script to rebuild the per-user telemetry aggregates from the telemetry table.
+New events update the aggregates as they are inserted; run this once after
+upgrading so the history recorded before then is counted too. Safe to run
+repeatedly and while the app is running: the table is rebuilt in a single
+transaction that holds the write lock, so no event is counted twice.
+
+    python backfill_telemetry_aggregates.py
+"""
+from sqlalchemy import select
+from app import create_app
+from models import Telemetry, TelemetryAggregate, db
+from services.telemetry_aggregates import AGGREGATED_EVENTS, aggregate_deltas, apply_aggregate_deltas
+
+BATCH_SIZE = 5000
+
+def backfill():
+    app = create_app()
+    
+    with app.app_context():
+        print("🔧 Rebuilding telemetry aggregates...")
+        with db.engine.begin() as conn:
+            # Deleting first takes the write lock, so no insert lands between the scan and the upsert
+            conn.execute(TelemetryAggregate.__table__.delete())
+            
+            query = select(
+                Telemetry.user_id, Telemetry.event_type, Telemetry.event_data
+            ).where(Telemetry.event_type.in_(AGGREGATED_EVENTS))
+            
+            deltas = {}
+            scanned = 0
+            result = conn.execution_options(yield_per=BATCH_SIZE).execute(query).mappings()
+            for rows in result.partitions():
+                aggregate_deltas(rows, deltas)
+                scanned += len(rows)
+                print(f"   Scanned {scanned} events...")
+            
+            apply_aggregate_deltas(conn, deltas)
+        
+        users = len({user_id for user_id, _ in deltas})
+        print(f"\n✅ Aggregated {scanned} events into {len(deltas)} rows for {users} users")
+
+if __name__ == '__main__':
+    backfill()
@@ -0,0 +1,223 @@
+"""
+Benchmark the hot queries against a seeded database and show their query plans.
+Seeds a throwaway SQLite file with the schema from models.py (millions of
+telemetry rows by default), then times each query the API runs on every
+lesson view, next-component call and dashboard load.
+
+    python benchmark_queries.py                        # 2M telemetry rows, with indexes
+    python benchmark_queries.py --no-indexes           # same data, primary keys only
+    python benchmark_queries.py --telemetry-rows 500000 --users 200
+
+A plan line starting with SCAN on a large table means a full table scan.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from models import db
+
+EVENT_TYPES = ['time_spent', 'quiz_answer', 'card_flip', 'component_view', 'practice_exercise_graded']
+COMPONENT_TYPES = ['info_card', 'flashcard', 'quiz', 'mindmap', 'practice_exercise']
+
+# (name, SQL, function returning parameters for one run); mirrors the ORM queries in routes/ and services/
+HOT_QUERIES = [
+    ('recent telemetry (next-component)',
+     "SELECT * FROM telemetry WHERE user_id = ? AND lesson_id = ? ORDER BY timestamp DESC LIMIT 50",
+     lambda d: (d.user(), d.lesson())),
+    ('telemetry aggregates (next-component)',
+     "SELECT * FROM telemetry_aggregate WHERE user_id = ?",
+     lambda d: (d.user(),)),
+    ('latest unfinished lesson (dashboard)',
+     "SELECT * FROM lesson_progress WHERE user_id = ? AND completed = 0 ORDER BY last_accessed DESC LIMIT 1",
+     lambda d: (d.user(),)),
+    ('lesson progress lookup',
+     "SELECT * FROM lesson_progress WHERE lesson_id = ? AND user_id = ? LIMIT 1",
+     lambda d: (d.lesson(), d.user())),
+    ('lesson components',
+     'SELECT * FROM lesson_component WHERE lesson_id = ? ORDER BY "order"',
+     lambda d: (d.lesson(),)),
+    ('component count',
+     "SELECT count(*) FROM lesson_component WHERE lesson_id = ?",
+     lambda d: (d.lesson(),)),
+    ('learning objectives',
+     'SELECT * FROM learning_objective WHERE lesson_id = ? ORDER BY "order"',
+     lambda d: (d.lesson(),)),
+    ('next lesson',
+     "SELECT * FROM lesson WHERE module_id = ? AND lesson_number > ? ORDER BY lesson_number LIMIT 1",
+     lambda d: (d.module(), 1)),
+    ('modules of user',
+     "SELECT * FROM module WHERE user_id = ?",
+     lambda d: (d.user(),)),
+    ('active insights (dashboard)',
+     "SELECT * FROM insight WHERE user_id = ? AND is_active = 1 ORDER BY created_at DESC LIMIT 5",
+     lambda d: (d.user(),)),
+]
+
+class Dataset:
+    """Random ids drawn from the seeded ranges"""
+    
+    def __init__(self, users, modules, lessons):
+        self.users = users
+        self.modules = modules
+        self.lessons = lessons
+    
+    def user(self):
+        return random.randint(1, self.users)
+    
+    def module(self):
+        return random.randint(1, self.modules)
+    
+    def lesson(self):
+        return random.randint(1, self.lessons)
+
+def create_schema(db_path, with_indexes):
+    engine = create_engine(f"sqlite:///{db_path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+    
+    conn = sqlite3.connect(db_path)
+    if not with_indexes:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+    return conn
+
+def seed(conn, users, modules_per_user, lessons_per_module, components_per_lesson, telemetry_rows):
+    start = time.time()
+    now = datetime.utcnow()
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    
+    total_modules = users * modules_per_user
+    total_lessons = total_modules * lessons_per_module
+    
+    with conn:
+        conn.executemany(
+            "INSERT INTO user (id, username, password_hash, created_at) VALUES (?, ?, 'x', ?)",
+            ((u, f"user{u}", now) for u in range(1, users + 1))
+        )
+        conn.executemany(
+            "INSERT INTO module (id, name, user_id, created_at, processing_status, version) VALUES (?, ?, ?, ?, 'completed', 1)",
+            ((m, f"Module {m}", (m - 1) // modules_per_user + 1, now) for m in range(1, total_modules + 1))
+        )
+        conn.executemany(
+            "INSERT INTO lesson (id, title, module_id, lesson_number, created_at, version) VALUES (?, ?, ?, ?, ?, 1)",
+            ((l, f"Lesson {l}", (l - 1) // lessons_per_module + 1, (l - 1) % lessons_per_module + 1, now)
+             for l in range(1, total_lessons + 1))
+        )
+        conn.executemany(
+            'INSERT INTO lesson_component (lesson_id, component_type, component_data, "order", created_at) VALUES (?, ?, ?, ?, ?)',
+            ((l, COMPONENT_TYPES[o % len(COMPONENT_TYPES)], '{"title": "t", "content": "c"}', o, now)
+             for l in range(1, total_lessons + 1) for o in range(components_per_lesson))
+        )
+        conn.executemany(
+            'INSERT INTO learning_objective (lesson_id, objective_text, "order", completed) VALUES (?, ?, ?, 0)',
+            ((l, f"Objective {o}", o) for l in range(1, total_lessons + 1) for o in range(4))
+        )
+        conn.executemany(
+            "INSERT INTO lesson_progress (lesson_id, user_id, progress_percentage, last_accessed, completed, current_component_index) VALUES (?, ?, ?, ?, ?, 0)",
+            ((l, (l - 1) // (lessons_per_module * modules_per_user) + 1, 50.0,
+              now - timedelta(minutes=random.randint(0, 100000)), random.random() < 0.5)
+             for l in range(1, total_lessons + 1))
+        )
+        conn.executemany(
+            "INSERT INTO insight (user_id, insight_text, insight_type, confidence_score, created_at, is_active) VALUES (?, 'insight', 'performance', 0.7, ?, ?)",
+            ((u, now - timedelta(minutes=i), i < 5) for u in range(1, users + 1) for i in range(10))
+        )
+    print(f"   ✓ Seeded {users} users, {total_modules} modules, {total_lessons} lessons in {time.time() - start:.1f}s")
+    
+    start = time.time()
+    lessons_per_user = modules_per_user * lessons_per_module
+    batch = 100000
+    
+    def telemetry_batch(count):
+        for _ in range(count):
+            user_id = random.randint(1, users)
+            lesson_id = (user_id - 1) * lessons_per_user + random.randint(1, lessons_per_user)
+            yield (
+                user_id,
+                lesson_id,
+                random.choice(EVENT_TYPES),
+                '{"time_seconds": 42, "component_type": "quiz", "correct": true}',
+                now - timedelta(seconds=random.randint(0, 90 * 86400))
+            )
+    
+    for offset in range(0, telemetry_rows, batch):
+        with conn:
+            conn.executemany(
+                "INSERT INTO telemetry (user_id, lesson_id, event_type, event_data, timestamp) VALUES (?, ?, ?, ?, ?)",
+                telemetry_batch(min(batch, telemetry_rows - offset))
+            )
+    with conn:
+        conn.execute("""
+            INSERT INTO telemetry_aggregate (user_id, component_type, interactions, time_seconds, quiz_attempts, quiz_correct)
+            SELECT user_id, json_extract(event_data, '$.component_type'),
+                   sum(event_type = 'time_spent'), sum(CASE WHEN event_type = 'time_spent' THEN 42 ELSE 0 END),
+                   sum(event_type = 'quiz_answer'), sum(event_type = 'quiz_answer')
+            FROM telemetry GROUP BY user_id
+        """)
+    conn.execute("ANALYZE")
+    print(f"   ✓ Seeded {telemetry_rows} telemetry rows in {time.time() - start:.1f}s")
+    
+    return Dataset(users, total_modules, total_lessons)
+
+def benchmark(conn, dataset, runs):
+    print(f"\n{'query':<42} {'median ms':>10} {'p95 ms':>10}  plan")
+    print("-" * 110)
+    scans = []
+    
+    for name, sql, params in HOT_QUERIES:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params(dataset))]
+        
+        timings = []
+        for _ in range(runs):
+            args = params(dataset)
+            started = time.perf_counter()
+            conn.execute(sql, args).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        
+        median = statistics.median(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{name:<42} {median:>10.3f} {p95:>10.3f}  {' | '.join(plan)}")
+        
+        if any(step.startswith('SCAN') and 'USING' not in step for step in plan):
+            scans.append(name)
+    
+    if scans:
+        print(f"\n⚠️  Full table scans: {', '.join(scans)}")
+    else:
+        print("\n✅ Every hot query uses an index")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark hot queries on a seeded database')
+    parser.add_argument('--telemetry-rows', type=int, default=2000000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--modules-per-user', type=int, default=5)
+    parser.add_argument('--lessons-per-module', type=int, default=8)
+    parser.add_argument('--components-per-lesson', type=int, default=20)
+    parser.add_argument('--runs', type=int, default=200, help='Executions per query')
+    parser.add_argument('--no-indexes', action='store_true', help='Drop the secondary indexes before seeding')
+    parser.add_argument('--db', help='Database file to create (default: a temporary file, removed afterwards)')
+    args = parser.parse_args()
+    
+    random.seed(42)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    
+    print(f"🌱 Seeding {db_path} ({'without' if args.no_indexes else 'with'} indexes)...")
+    conn = create_schema(db_path, with_indexes=not args.no_indexes)
+    try:
+        dataset = seed(conn, args.users, args.modules_per_user, args.lessons_per_module,
+                       args.components_per_lesson, args.telemetry_rows)
+        benchmark(conn, dataset, args.runs)
+    finally:
+        conn.close()
+        if not args.db:
+            os.remove(db_path)
@@ -0,0 +1,79 @@
+import zlib
+from sqlalchemy.types import TypeDecorator, LargeBinary, Text
+
+# Preset dictionary for zlib: fragments that recur across component and
+# telemetry payloads. zlib favours matches near the end, so the most common
+# fragments come last. Never edit it in place: stored rows depend on it, so
+# a new dictionary needs a new format byte.
+COMPONENT_DICTIONARY_V1 = (
+    b'import React, { useState, useEffect } from "react"; return function() { const [state, setState] = useState(null); '
+    b'className="card bg-base-100 shadow-xl" className="btn btn-primary" onClick={() => } style={{ }} <div className="'
+    b'</div> </p> </button> </span> <h2 className="text-xl font-bold"> '
+    b'"accounts": [{"account_id": "role": "instructions": "analysis_questions": [{"question_number": '
+    b'"passage": "scenario": "hint": "sample_answer": "rubric": "points": '
+    b'"central": "nodes": [{"id": "label": "children": [{"description": '
+    b'"front": "back": "cards": [{"options": ["correct_answer": "correct": true, "correct": false, "explanation": '
+    b'"question": "questions": [{"text": "items": ["code": "title": "content": "summary": "key_points": ["'
+    b'"component_type": "time_seconds": "component_id": "answer": "selected": "card_flip", "quiz_answer", "time_spent", '
+    b'", "type": "info_card", "flashcard", "quiz", "mindmap", "practice_exercise", "custom", "data": {"'
+)
+
+RAW = b'\x00'  # Uncompressed UTF-8 (payloads too small to benefit)
+ZLIB_V1 = b'\x01'  # zlib with COMPONENT_DICTIONARY_V1
+
+def encode_text(text, min_size=200):
+    """Serialize a string into the compressed column format"""
+    data = text.encode('utf-8')
+    if len(data) < min_size:
+        return RAW + data
+    compressor = zlib.compressobj(level=6, zdict=COMPONENT_DICTIONARY_V1)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) >= len(data):
+        return RAW + data
+    return ZLIB_V1 + compressed
+
+def decode_text(value):
+    """Inverse of encode_text; plain str values (rows written before compression) pass through"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    fmt, payload = value[:1], value[1:]
+    if fmt == ZLIB_V1:
+        decompressor = zlib.decompressobj(zdict=COMPONENT_DICTIONARY_V1)
+        return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+    if fmt == RAW:
+        return payload.decode('utf-8')
+    raise ValueError(f"Unknown compressed text format {fmt!r}")
+
+class CompressedText(TypeDecorator):
+    """Text column stored zlib-compressed; reads and writes plain strings.
+    
+    On SQLite the column keeps TEXT affinity, so rows written before this
+    type existed are still returned as they are. migrate_compress_blobs.py
+    rewrites them in the compressed format.
+    
+    Values are decoded as rows load, so models map these columns with
+    db.deferred(): rows loaded only for their other columns never fetch or
+    decompress the payload, and bulk readers undefer it in the same query.
+    """
+    
+    impl = LargeBinary
+    cache_ok = True
+    
+    def __init__(self, min_size=200):
+        super().__init__()
+        self.min_size = min_size
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'sqlite':
+            # Dynamic typing: BLOBs and legacy TEXT values come back untouched
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(LargeBinary())
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return encode_text(value, self.min_size)
+    
+    def process_result_value(self, value, dialect):
+        return decode_text(value)
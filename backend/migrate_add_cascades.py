@@ -0,0 +1,106 @@
+"""
+Script to add ON DELETE CASCADE to the foreign keys of an existing database.
+SQLite cannot alter a constraint, so every table whose foreign keys differ
+from models.py is rebuilt: renamed, recreated from the model, refilled and
+dropped. Rows left orphaned by earlier deletes are removed, since they would
+violate the constraints once foreign keys are enforced.
+Run migrate_db.py first. This will PRESERVE your existing data. Safe to run
+repeatedly.
+"""
+import sqlite3
+import os
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable, CreateIndex
+from models import db
+
+def needs_rebuild(cursor, table):
+    """True if a foreign key of the table lacks the ON DELETE action declared in the model"""
+    cursor.execute(f"PRAGMA foreign_key_list({table.name})")
+    existing = {(row[2], row[3]): row[6] for row in cursor.fetchall()}  # (parent, column) -> on_delete
+    
+    for fk in table.foreign_keys:
+        wanted = (fk.ondelete or 'NO ACTION').upper()
+        if existing.get((fk.column.table.name, fk.parent.name), 'NO ACTION').upper() != wanted:
+            return True
+    return False
+
+def rebuild_table(cursor, table):
+    dialect = sqlite.dialect()
+    
+    cursor.execute(f"PRAGMA table_info({table.name})")
+    old_columns = {row[1] for row in cursor.fetchall()}
+    columns = ', '.join(f'"{c.name}"' for c in table.columns if c.name in old_columns)
+    
+    cursor.execute(f"PRAGMA index_list({table.name})")
+    for row in cursor.fetchall():
+        if not row[1].startswith('sqlite_autoindex'):
+            cursor.execute(f"DROP INDEX {row[1]}")
+    
+    cursor.execute(f"ALTER TABLE {table.name} RENAME TO _old_{table.name}")
+    cursor.execute(str(CreateTable(table).compile(dialect=dialect)))
+    for index in table.indexes:
+        cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+    cursor.execute(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM _old_{table.name}")
+    cursor.execute(f"DROP TABLE _old_{table.name}")
+
+def migrate_database():
+    # Check both possible locations
+    db_paths = ['ai_tutor.db', 'instance/ai_tutor.db']
+    db_path = None
+    
+    for path in db_paths:
+        if os.path.exists(path):
+            db_path = path
+            break
+    
+    if not db_path:
+        print(f"❌ Database not found in any of these locations: {db_paths}")
+        return
+    
+    print(f"🔧 Adding cascading foreign keys to {db_path}")
+    
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    
+    try:
+        # Must be set outside a transaction. legacy_alter_table keeps the
+        # RENAME below from rewriting references in other tables to _old_*
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.execute("PRAGMA legacy_alter_table = ON")
+        cursor.execute("BEGIN")
+        
+        rebuilt = 0
+        for table in db.metadata.sorted_tables:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,))
+            if not cursor.fetchone() or not needs_rebuild(cursor, table):
+                continue
+            print(f"   Rebuilding {table.name}...")
+            rebuild_table(cursor, table)
+            rebuilt += 1
+        
+        # Orphans from earlier deletes. Removing one can orphan its own
+        # children, so repeat until the check comes back clean
+        removed = 0
+        while True:
+            cursor.execute("PRAGMA foreign_key_check")
+            orphans = cursor.fetchall()
+            if not orphans:
+                break
+            for table_name, rowid, parent, _ in orphans:
+                cursor.execute(f"DELETE FROM {table_name} WHERE rowid = ?", (rowid,))
+            removed += len(orphans)
+        if removed:
+            print(f"   Removed {removed} orphaned rows")
+        
+        cursor.execute("COMMIT")
+        print(f"\n✅ Migration completed! Rebuilt {rebuilt} tables")
+        print("   Your existing data has been preserved.")
+    
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        cursor.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    migrate_database()
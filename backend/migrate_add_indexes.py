@@ -0,0 +1,44 @@
+"""
+Script to add the composite indexes declared in models.py to an existing database.
+New databases get them from db.create_all(); existing tables don't, so run
+this once after upgrading. Safe to run repeatedly.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+from app import create_app
+from models import db
+
+def add_indexes():
+    app = create_app()
+    
+    with app.app_context():
+        inspector = inspect(db.engine)
+        created = 0
+        
+        print("🔧 Adding indexes...")
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            
+            for index in table.indexes:
+                if index.name in existing:
+                    print(f"   ⚠️  {index.name} already exists")
+                    continue
+                print(f"   Creating {index.name} on {table.name}({', '.join(c.name for c in index.columns)})...")
+                try:
+                    index.create(db.engine)
+                except IntegrityError:
+                    # A unique index over rows that already hold duplicates
+                    print(f"   ❌ {index.name} not created: {table.name} has duplicate values; resolve them and run again")
+                    continue
+                created += 1
+        
+        # Refresh planner statistics so SQLite actually picks the new indexes
+        with db.engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        
+        print(f"\n✅ Created {created} indexes and refreshed statistics")
+
+if __name__ == '__main__':
+    add_indexes()
@@ -0,0 +1,93 @@
+"""
+Script to compress existing component and telemetry JSON in place.
+LessonComponent.component_data and Telemetry.event_data are now stored in the
+compressed format from db_types.py. Old plain-text rows still read fine, but
+only get smaller once rewritten; run this once after upgrading. Safe to run
+repeatedly (already-compressed rows are skipped) and to interrupt.
+"""
+import sqlite3
+import os
+import sys
+from db_types import encode_text
+
+# (table, column) pairs stored with CompressedText
+COLUMNS = [
+    ('lesson_component', 'component_data'),
+    ('telemetry', 'event_data'),
+]
+
+BATCH_SIZE = 1000
+
+def compress_column(conn, table, column):
+    total = conn.execute(f"SELECT count(*) FROM {table} WHERE typeof({column}) = 'text'").fetchone()[0]
+    if not total:
+        print(f"   ⚠️  {table}.{column} already compressed")
+        return 0, 0
+    
+    print(f"   Compressing {total} rows in {table}.{column}...")
+    converted = 0
+    bytes_before = 0
+    bytes_after = 0
+    last_id = 0
+    
+    while True:
+        rows = conn.execute(
+            f"SELECT id, {column} FROM {table} WHERE id > ? AND typeof({column}) = 'text' ORDER BY id LIMIT ?",
+            (last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        
+        updates = []
+        for row_id, value in rows:
+            encoded = encode_text(value)
+            bytes_before += len(value.encode('utf-8'))
+            bytes_after += len(encoded)
+            updates.append((encoded, row_id))
+        
+        # One transaction per batch keeps the write lock short for a running app
+        with conn:
+            conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", updates)
+        
+        converted += len(rows)
+        last_id = rows[-1][0]
+        print(f"      {converted}/{total}")
+    
+    return bytes_before, bytes_after
+
+def migrate_database():
+    # Check both possible locations
+    db_paths = ['ai_tutor.db', 'instance/ai_tutor.db']
+    db_path = None
+    
+    for path in db_paths:
+        if os.path.exists(path):
+            db_path = path
+            break
+    
+    if not db_path:
+        print(f"❌ Database not found in any of these locations: {db_paths}")
+        return
+    
+    print(f"🔧 Compressing JSON columns in {db_path}")
+    size_before = os.path.getsize(db_path)
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        for table, column in COLUMNS:
+            before, after = compress_column(conn, table, column)
+            if before:
+                print(f"   ✓ {table}.{column}: {before / 1024:.1f} KB -> {after / 1024:.1f} KB")
+        
+        # Freed pages stay in the file until it is rebuilt
+        if '--no-vacuum' not in sys.argv:
+            print("   Vacuuming...")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    
+    size_after = os.path.getsize(db_path)
+    print(f"\n✅ Migration completed! Database file: {size_before / 1024:.1f} KB -> {size_after / 1024:.1f} KB")
+
+if __name__ == "__main__":
+    migrate_database()
@@ -46,10 +46,81 @@ def migrate_database():
         else:
             print("   ⚠️  processing_progress column already exists")
         
+        # Add index_version column if it doesn't exist
+        if 'index_version' not in columns:
+            print("   Adding index_version column...")
+            cursor.execute("ALTER TABLE module ADD COLUMN index_version INTEGER DEFAULT 0")
+            print("   ✓ index_version column added")
+        else:
+            print("   ⚠️  index_version column already exists")
+        
+        # Add processing_stage column if it doesn't exist
+        if 'processing_stage' not in columns:
+            print("   Adding processing_stage column...")
+            cursor.execute("ALTER TABLE module ADD COLUMN processing_stage VARCHAR(50)")
+            print("   ✓ processing_stage column added")
+        else:
+            print("   ⚠️  processing_stage column already exists")
+        
+        # Add version column if it doesn't exist
+        if 'version' not in columns:
+            print("   Adding module.version column...")
+            cursor.execute("ALTER TABLE module ADD COLUMN version INTEGER DEFAULT 1")
+            print("   ✓ module.version column added")
+        else:
+            print("   ⚠️  module.version column already exists")
+        
+        # Add deleted_at column if it doesn't exist
+        if 'deleted_at' not in columns:
+            print("   Adding module.deleted_at column...")
+            cursor.execute("ALTER TABLE module ADD COLUMN deleted_at DATETIME")
+            print("   ✓ module.deleted_at column added")
+        else:
+            print("   ⚠️  module.deleted_at column already exists")
+        
+        cursor.execute("PRAGMA table_info(lesson)")
+        lesson_columns = [row[1] for row in cursor.fetchall()]
+        
+        # Add version column to lesson if it doesn't exist
+        if 'version' not in lesson_columns:
+            print("   Adding lesson.version column...")
+            cursor.execute("ALTER TABLE lesson ADD COLUMN version INTEGER DEFAULT 1")
+            print("   ✓ lesson.version column added")
+        else:
+            print("   ⚠️  lesson.version column already exists")
+        
+        # Add content_version column to lesson if it doesn't exist
+        if 'content_version' not in lesson_columns:
+            print("   Adding lesson.content_version column...")
+            cursor.execute("ALTER TABLE lesson ADD COLUMN content_version INTEGER DEFAULT 1")
+            print("   ✓ lesson.content_version column added")
+        else:
+            print("   ⚠️  lesson.content_version column already exists")
+        
+        cursor.execute("PRAGMA table_info(file)")
+        file_columns = [row[1] for row in cursor.fetchall()]
+        
+        # Add summary column to file if it doesn't exist
+        if 'summary' not in file_columns:
+            print("   Adding file.summary column...")
+            cursor.execute("ALTER TABLE file ADD COLUMN summary TEXT")
+            print("   ✓ file.summary column added")
+        else:
+            print("   ⚠️  file.summary column already exists")
+        
+        # Add extracted column to file if it doesn't exist
+        if 'extracted' not in file_columns:
+            print("   Adding file.extracted column...")
+            cursor.execute("ALTER TABLE file ADD COLUMN extracted BOOLEAN DEFAULT 0")
+            cursor.execute("UPDATE file SET extracted = 1 WHERE vector_id IS NOT NULL")
+            print("   ✓ file.extracted column added")
+        else:
+            print("   ⚠️  file.extracted column already exists")
+        
         conn.commit()
         print("\n✅ Migration completed successfully!")
         print("   Your existing data has been preserved.")
-        
+    
     except Exception as e:
         print(f"\n❌ Migration failed: {e}")
         conn.rollback()
@@ -1,9 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from db_types import CompressedText
 
 db = SQLAlchemy()
 
+def configure_sqlite(engine, config):
+    """Apply concurrency pragmas to every new SQLite connection.
+    
+    WAL lets request threads keep reading while the processing worker
+    writes, and busy_timeout makes writers wait for the lock instead of
+    failing with "database is locked". foreign_keys is off by default in
+    SQLite; it has to be on for the ON DELETE CASCADE clauses below.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+        cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        cursor.execute(f"PRAGMA cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.close()
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -13,6 +38,7 @@ class User(db.Model):
     modules = db.relationship('Module', backref='user', lazy=True, cascade='all, delete-orphan')
     telemetry = db.relationship('Telemetry', backref='user', lazy=True, cascade='all, delete-orphan')
     insights = db.relationship('Insight', backref='user', lazy=True, cascade='all, delete-orphan')
+    telemetry_aggregates = db.relationship('TelemetryAggregate', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -29,64 +55,117 @@ class Module(db.Model):
     processing_status = db.Column(db.String(50), default='pending')  # pending, processing, completed, error
     processing_step = db.Column(db.String(200))  # Current processing step description
     processing_progress = db.Column(db.Integer, default=0)  # 0-100 percentage
+    processing_stage = db.Column(db.String(50))  # Last pipeline stage reached: extract, embed, summarize, curriculum, objectives, pregenerate, done
+    index_version = db.Column(db.Integer, default=0)  # Bumped whenever file content is (re)indexed
+    version = db.Column(db.Integer, default=1)  # Bumped on any change to the module, its files or lessons (ETag)
+    deleted_at = db.Column(db.DateTime)  # Set when deletion is requested; the row is purged by a background job
+    
+    # Child rows are removed by the database (ON DELETE CASCADE), not loaded and deleted one by one
+    files = db.relationship('File', backref='module', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    lessons = db.relationship('Lesson', backref='module', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
-    files = db.relationship('File', backref='module', lazy=True, cascade='all, delete-orphan')
-    lessons = db.relationship('Lesson', backref='module', lazy=True, cascade='all, delete-orphan')
+    __table_args__ = (
+        db.Index('ix_module_user_id', 'user_id'),
+    )
 
 class File(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(500), nullable=False)
     file_path = db.Column(db.String(1000), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)
-    module_id = db.Column(db.Integer, db.ForeignKey('module.id'), nullable=False)
+    module_id = db.Column(db.Integer, db.ForeignKey('module.id', ondelete='CASCADE'), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
-    vector_id = db.Column(db.String(200))  # ChromaDB collection ID
+    extracted = db.Column(db.Boolean, default=False)  # Text chunks are in the keyword index
+    vector_id = db.Column(db.String(200))  # ChromaDB collection ID (set once embedded)
+    summary = db.Column(db.Text)  # Compact LLM summary used as curriculum context
+    
+    __table_args__ = (
+        db.Index('ix_file_module_id', 'module_id'),
+    )
+
+class UploadSession(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # Random hex token used in upload URLs
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    module_id = db.Column(db.Integer, db.ForeignKey('module.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.String(500), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_bytes = db.Column(db.BigInteger, default=0)
+    checksum = db.Column(db.String(64))  # Optional SHA-256 of the whole file
+    temp_path = db.Column(db.String(1000), nullable=False)
+    status = db.Column(db.String(20), default='uploading')  # uploading, completed, failed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Lesson(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(500), nullable=False)
-    module_id = db.Column(db.Integer, db.ForeignKey('module.id'), nullable=False)
+    module_id = db.Column(db.Integer, db.ForeignKey('module.id', ondelete='CASCADE'), nullable=False)
     lesson_number = db.Column(db.Integer, nullable=False)
     plan = db.Column(db.Text)  # High-level plan
     file_ids = db.Column(db.Text)  # JSON string of file IDs
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, default=1)  # Bumped on changes to the lesson, its objectives, components or progress (ETag)
+    content_version = db.Column(db.Integer, default=1)  # Like version, but not for progress (lesson payload cache key)
+    
+    objectives = db.relationship('LearningObjective', backref='lesson', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    progress = db.relationship('LessonProgress', backref='lesson', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    components = db.relationship('LessonComponent', backref='lesson', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
-    objectives = db.relationship('LearningObjective', backref='lesson', lazy=True, cascade='all, delete-orphan')
-    progress = db.relationship('LessonProgress', backref='lesson', lazy=True, cascade='all, delete-orphan')
-    components = db.relationship('LessonComponent', backref='lesson', lazy=True, cascade='all, delete-orphan')
+    __table_args__ = (
+        db.Index('ix_lesson_module_number', 'module_id', 'lesson_number'),
+    )
 
 class LearningObjective(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id', ondelete='CASCADE'), nullable=False)
     objective_text = db.Column(db.Text, nullable=False)
     order = db.Column(db.Integer, nullable=False)
     completed = db.Column(db.Boolean, default=False)
+    
+    __table_args__ = (
+        db.Index('ix_learning_objective_lesson_order', 'lesson_id', 'order'),
+    )
 
 class LessonProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     progress_percentage = db.Column(db.Float, default=0.0)
     last_accessed = db.Column(db.DateTime, default=datetime.utcnow)
     completed = db.Column(db.Boolean, default=False)
     current_component_index = db.Column(db.Integer, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_lesson_progress_user_lesson', 'user_id', 'lesson_id'),
+        db.Index('ix_lesson_progress_user_completed_accessed', 'user_id', 'completed', 'last_accessed'),
+    )
 
 class LessonComponent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id', ondelete='CASCADE'), nullable=False)
     component_type = db.Column(db.String(100), nullable=False)  # info_card, flashcard, quiz, mindmap, custom
-    component_data = db.Column(db.Text, nullable=False)  # JSON data for the component
+    # Deferred: fetched and decompressed only when read (see db_types.CompressedText)
+    component_data = db.deferred(db.Column(CompressedText(), nullable=False))  # JSON data for the component
     order = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_lesson_component_lesson_order', 'lesson_id', 'order'),
+    )
 
 class Telemetry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
-    component_id = db.Column(db.Integer, db.ForeignKey('lesson_component.id'))
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id', ondelete='CASCADE'), nullable=False)
+    component_id = db.Column(db.Integer, db.ForeignKey('lesson_component.id', ondelete='CASCADE'))
     event_type = db.Column(db.String(100), nullable=False)  # time_spent, quiz_answer, card_flip, etc.
-    event_data = db.Column(db.Text)  # JSON data
+    event_data = db.deferred(db.Column(CompressedText()))  # JSON data, deferred like component_data
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_telemetry_user_lesson_timestamp', 'user_id', 'lesson_id', 'timestamp'),
+        db.Index('ix_telemetry_user_event_type', 'user_id', 'event_type'),
+    )
 
 class Insight(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -96,3 +175,108 @@ class Insight(db.Model):
     confidence_score = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    
+    __table_args__ = (
+        db.Index('ix_insight_user_active_created', 'user_id', 'is_active', 'created_at'),
+    )
+
+# Running totals of each user's telemetry, updated in the same transaction as
+# every Telemetry insert (services/telemetry_aggregates.py)
+class TelemetryAggregate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    component_type = db.Column(db.String(100), nullable=False, default='')  # '' for events without one
+    interactions = db.Column(db.Integer, nullable=False, default=0)  # time_spent events
+    time_seconds = db.Column(db.Float, nullable=False, default=0)
+    quiz_attempts = db.Column(db.Integer, nullable=False, default=0)  # quiz_answer events
+    quiz_correct = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'component_type', name='uq_telemetry_aggregate_user_component'),
+    )
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(100), nullable=False)  # process_module, delete_vectors, ...
+    payload = db.Column(db.Text)  # JSON arguments for the handler
+    dedupe_key = db.Column(db.String(200))  # At most one queued/running job per key (ux_job_dedupe_key_active)
+    status = db.Column(db.String(20), default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)  # Not claimable before this (retry backoff)
+    locked_by = db.Column(db.String(64))  # Claim token of the worker running it
+    locked_until = db.Column(db.DateTime)  # Visibility timeout; expired running jobs are reclaimed
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+        db.Index('ux_job_dedupe_key_active', 'dedupe_key', unique=True,
+                 sqlite_where=status.in_(['queued', 'running']),
+                 postgresql_where=status.in_(['queued', 'running'])),
+    )
+
+
+# Content versions for ETags. Any flushed change to a lesson's objectives,
+# components or progress bumps the lesson; that and any change to a module's
+# own row, files or lessons bumps the module. Lesson.content_version ignores
+# progress so cached lesson content survives progress writes. Bulk
+# query.update()/delete() calls bypass this, so they must bump versions
+# themselves if it matters.
+@event.listens_for(Session, 'after_flush')
+def _bump_content_versions(session, flush_context):
+    lesson_ids = set()
+    content_lesson_ids = set()
+    module_ids = set()
+    
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        
+        if isinstance(obj, Module):
+            if obj not in session.new and obj not in session.deleted:
+                module_ids.add(obj.id)
+        elif isinstance(obj, Lesson):
+            module_ids.add(obj.module_id)
+            if obj not in session.new and obj not in session.deleted:
+                lesson_ids.add(obj.id)
+                content_lesson_ids.add(obj.id)
+        elif isinstance(obj, (LearningObjective, LessonComponent)):
+            lesson_ids.add(obj.lesson_id)
+            content_lesson_ids.add(obj.lesson_id)
+        elif isinstance(obj, LessonProgress):
+            lesson_ids.add(obj.lesson_id)
+        elif isinstance(obj, File):
+            module_ids.add(obj.module_id)
+    
+    lesson_ids.discard(None)
+    content_lesson_ids.discard(None)
+    module_ids.discard(None)
+    connection = session.connection()
+    
+    if content_lesson_ids:
+        connection.execute(
+            Lesson.__table__.update()
+            .where(Lesson.__table__.c.id.in_(content_lesson_ids))
+            .values(content_version=func.coalesce(Lesson.__table__.c.content_version, 1) + 1)
+        )
+    
+    if lesson_ids:
+        connection.execute(
+            Lesson.__table__.update()
+            .where(Lesson.__table__.c.id.in_(lesson_ids))
+            .values(version=func.coalesce(Lesson.__table__.c.version, 1) + 1)
+        )
+        parents = db.select(Lesson.__table__.c.module_id).where(Lesson.__table__.c.id.in_(lesson_ids))
+        module_ids.update(row[0] for row in connection.execute(parents))
+    
+    if module_ids:
+        connection.execute(
+            Module.__table__.update()
+            .where(Module.__table__.c.id.in_(module_ids))
+            .values(version=func.coalesce(Module.__table__.c.version, 1) + 1)
+        )
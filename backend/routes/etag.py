@@ -0,0 +1,26 @@
+from flask import Response, request, jsonify
+
+# Weak ETags built from content version columns. The version lookup is the
+# only work done for a repeat request; the payload is built only on a miss.
+
+def etag_matches(etag):
+    """True if the client's If-None-Match already has this version"""
+    return request.if_none_match.contains_weak(etag)
+
+def not_modified(etag):
+    return _with_etag(Response(status=304), etag)
+
+def json_with_etag(payload, etag, status=200):
+    response = jsonify(payload)
+    response.status_code = status
+    return _with_etag(response, etag)
+
+def json_text_with_etag(text, etag, status=200):
+    """Like json_with_etag for a body that is already serialized JSON"""
+    return _with_etag(Response(text, status=status, mimetype='application/json'), etag)
+
+def _with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    # Always revalidate, so a changed version is picked up immediately
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,16 @@
+from flask import Blueprint, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import User
+from services.job_queue import job_queue
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """Queue depth and recent job latency (covers every user's jobs, so admins only)"""
+    user = User.query.get(int(get_jwt_identity()))
+    if user is None or user.username not in current_app.config['ADMIN_USERNAMES']:
+        return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify(job_queue.metrics()), 200
@@ -3,6 +3,11 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Lesson, LessonProgress, LessonComponent, LearningObjective, Module, Insight, db
 from services.llm_service import LLMService
 from services.telemetry_service import TelemetryService
+from routes.etag import etag_matches, not_modified, json_text_with_etag
+from services.lesson_cache import lesson_cache
+from services.telemetry_buffer import telemetry_buffer
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
 import json
 
 lessons_bp = Blueprint('lessons', __name__)
@@ -11,7 +16,11 @@ lessons_bp = Blueprint('lessons', __name__)
 @jwt_required()
 def get_lesson(lesson_id):
     user_id = int(get_jwt_identity())
-    lesson = Lesson.query.get(lesson_id)
+    
+    # Versions and owner in one small query; the content itself usually comes from the cache
+    lesson = db.session.query(
+        Lesson.id, Lesson.module_id, Lesson.lesson_number, Lesson.version, Lesson.content_version, Module.user_id
+    ).outerjoin(Module, (Module.id == Lesson.module_id) & Module.deleted_at.is_(None)).filter(Lesson.id == lesson_id).first()
     
     print(f"=== GET LESSON {lesson_id} ===")
     print(f"User ID: {user_id}")
@@ -21,20 +30,30 @@ def get_lesson(lesson_id):
         print(f"❌ Lesson {lesson_id} not found")
         return jsonify({'error': 'Lesson not found'}), 404
     
-    # Check if user owns this lesson's module
-    module = Module.query.get(lesson.module_id)
-    print(f"Module found: {module is not None}, module_id: {lesson.module_id}")
-    
-    if not module:
+    if lesson.user_id is None:
         print(f"❌ Module {lesson.module_id} not found for lesson {lesson_id}")
         return jsonify({'error': 'Module not found'}), 404
     
-    if module.user_id != user_id:
-        print(f"❌ Unauthorized: module.user_id={module.user_id}, user_id={user_id}")
+    if lesson.user_id != user_id:
+        print(f"❌ Unauthorized: module.user_id={lesson.user_id}, user_id={user_id}")
         return jsonify({'error': 'Unauthorized'}), 403
     
     print(f"✓ Authorization passed")
     
+    # The next lesson belongs to the module, not to this lesson's versions, so it
+    # is looked up per request and kept out of the cached payload
+    next_lesson = db.session.query(Lesson.id, Lesson.title, Lesson.content_version).filter(
+        Lesson.module_id == lesson.module_id,
+        Lesson.lesson_number > lesson.lesson_number
+    ).order_by(Lesson.lesson_number).first()
+    next_tag = f"{next_lesson.id}.{next_lesson.content_version}" if next_lesson else "none"
+    
+    # Lesson.version covers objectives, components and progress. A client that
+    # holds an ETag already has a progress row, so nothing needs creating.
+    etag = f"lesson-{lesson.id}-{lesson.version}-next-{next_tag}"
+    if etag_matches(etag):
+        return not_modified(etag)
+    
     # Get or create progress
     progress = LessonProgress.query.filter_by(
         lesson_id=lesson_id,
@@ -50,13 +69,38 @@ def get_lesson(lesson_id):
         )
         db.session.add(progress)
         db.session.commit()
+        # Creating the row bumped the lesson's version
+        etag = f"lesson-{lesson.id}-{db.session.query(Lesson.version).filter(Lesson.id == lesson_id).scalar()}-next-{next_tag}"
+    
+    static_json = lesson_cache.get(lesson_id, lesson.content_version)
+    if static_json is None:
+        static_json = build_lesson_static_json(lesson_id)
+        lesson_cache.put(lesson_id, lesson.content_version, static_json)
+    
+    dynamic_json = json.dumps({
+        'progress': {
+            'percentage': progress.progress_percentage,
+            'current_component_index': progress.current_component_index,
+            'completed': progress.completed
+        },
+        'next_lesson': {'id': next_lesson.id, 'title': next_lesson.title} if next_lesson else None
+    })
+    
+    # Splice the per-request fields into the cached object instead of re-serializing it
+    return json_text_with_etag(dynamic_json[:-1] + ', ' + static_json[1:], etag)
+
+def build_lesson_static_json(lesson_id):
+    """Serialize the parts of a lesson payload that don't depend on the user"""
+    lesson = Lesson.query.get(lesson_id)
     
     # Get objectives
     objectives = LearningObjective.query.filter_by(lesson_id=lesson_id).order_by(LearningObjective.order).all()
     objectives_data = [{'id': obj.id, 'text': obj.objective_text, 'completed': obj.completed} for obj in objectives]
     
     # Get components
-    components = LessonComponent.query.filter_by(lesson_id=lesson_id).order_by(LessonComponent.order).all()
+    components = LessonComponent.query.options(undefer(LessonComponent.component_data)).filter_by(
+        lesson_id=lesson_id
+    ).order_by(LessonComponent.order).all()
     components_data = []
     for comp in components:
         components_data.append({
@@ -66,35 +110,14 @@ def get_lesson(lesson_id):
             'order': comp.order
         })
     
-    # Get module_id and next lesson info
-    module_id = lesson.module_id
-    
-    # Find next lesson in the same module
-    next_lesson_info = None
-    next_lesson = Lesson.query.filter_by(module_id=lesson.module_id).filter(
-        Lesson.lesson_number > lesson.lesson_number
-    ).order_by(Lesson.lesson_number).first()
-    
-    if next_lesson:
-        next_lesson_info = {
-            'id': next_lesson.id,
-            'title': next_lesson.title
-        }
-    
-    return jsonify({
+    return json.dumps({
         'id': lesson.id,
         'title': lesson.title,
         'plan': lesson.plan,
         'objectives': objectives_data,
-        'progress': {
-            'percentage': progress.progress_percentage,
-            'current_component_index': progress.current_component_index,
-            'completed': progress.completed
-        },
         'components': components_data,
-        'module_id': module_id,
-        'next_lesson': next_lesson_info
-    }), 200
+        'module_id': lesson.module_id
+    })
 
 @lessons_bp.route('/<int:lesson_id>/start', methods=['POST'])
 @jwt_required()
@@ -122,26 +145,34 @@ def start_lesson(lesson_id):
             insights=insights
         )
         
-        for comp_data in components_data:
-            # Validate component before saving
-            is_valid, error_msg = llm_service._validate_component(comp_data)
-            if not is_valid:
-                print(f"⚠️ Skipping invalid component: {error_msg}")
-                print(f"   Component type: {comp_data.get('type', 'unknown')}")
-                continue
-            
-            component = LessonComponent(
-                lesson_id=lesson_id,
-                component_type=comp_data['type'],
-                component_data=json.dumps(comp_data['data']),
-                order=comp_data['order']
-            )
-            db.session.add(component)
-        
+        save_generated_components(lesson_id, components_data, llm_service)
         db.session.commit()
     
     return jsonify({'message': 'Lesson started'}), 200
 
+def save_generated_components(lesson_id, components_data, llm_service):
+    """Validate generated components and add them to the session (caller commits)"""
+    saved = 0
+    for comp_data in components_data:
+        # Validate component before saving
+        is_valid, error_msg = llm_service._validate_component(comp_data)
+        if not is_valid:
+            print(f"⚠️ Skipping invalid component: {error_msg}")
+            print(f"   Component type: {comp_data.get('type', 'unknown')}")
+            continue
+        
+        component = LessonComponent(
+            lesson_id=lesson_id,
+            component_type=comp_data['type'],
+            component_data=json.dumps(comp_data['data']),
+            order=comp_data['order']
+        )
+        db.session.add(component)
+        saved += 1
+    
+    lesson_cache.invalidate(lesson_id)
+    return saved
+
 @lessons_bp.route('/<int:lesson_id>/next-component', methods=['POST'])
 @jwt_required()
 def get_next_component(lesson_id):
@@ -149,40 +180,47 @@ def get_next_component(lesson_id):
     data = request.get_json()
     current_index = data.get('current_index', 0)
     
-    # Get current total components count BEFORE updating
-    total_components_before = LessonComponent.query.filter_by(lesson_id=lesson_id).count()
+    # The analysis and objective evaluation below read telemetry, including
+    # events still buffered. If the flush fails they run on what is stored.
+    try:
+        telemetry_buffer.flush()
+    except Exception as e:
+        print(f"⚠️ Telemetry flush before next-component failed: {e}")
+    
+    # All writes happen in one transaction at the end. Until then the session
+    # is only read from, so no write lock is held during the LLM calls.
+    total_components_before, max_order = db.session.query(
+        func.count(LessonComponent.id), func.max(LessonComponent.order)
+    ).filter(LessonComponent.lesson_id == lesson_id).one()
+    next_order = total_components_before if max_order is None else max(max_order + 1, total_components_before)
     
-    # Update progress
     progress = LessonProgress.query.filter_by(
         lesson_id=lesson_id,
         user_id=user_id
     ).first()
     
-    if progress:
-        progress.current_component_index = current_index + 1
-        db.session.commit()
-    
-    # Get telemetry and insights
+    # Get telemetry and insights (new insights are committed with the rest)
     llm_service = LLMService()
     telemetry_service = TelemetryService()
     recent_telemetry = telemetry_service.get_recent_telemetry(user_id, lesson_id)
-    insights = telemetry_service.analyze_telemetry(user_id, lesson_id, recent_telemetry)
+    insights = telemetry_service.analyze_telemetry(user_id, lesson_id, recent_telemetry, commit=False)
     
-    adaptive_component_generated = False
     adaptive_reason = None
     evaluation_result = None
     objectives_met = False
     can_complete = False
+    new_components = []
     
     # Check if we've finished the structured lesson components
     if current_index + 1 >= total_components_before:
         print("📊 End of structured components reached. Evaluating learning objectives...")
         
         # Evaluate if learning objectives are met
-        objectives_met, evaluation_data, should_continue = llm_service.evaluate_learning_objectives(
-            lesson_id=lesson_id,
-            user_id=user_id
-        )
+        with db.session.no_autoflush:
+            objectives_met, evaluation_data, should_continue = llm_service.evaluate_learning_objectives(
+                lesson_id=lesson_id,
+                user_id=user_id
+            )
         
         evaluation_result = evaluation_data
         
@@ -205,38 +243,31 @@ def get_next_component(lesson_id):
             print(f"🎯 Generating adaptive component batch for: {adaptive_reason}")
             
             # Generate a BATCH of components (teaching + testing)
-            new_components_data = llm_service.generate_adaptive_batch(
-                lesson_id=lesson_id,
-                insights=insights,
-                recent_telemetry=recent_telemetry,
-                evaluation_data=evaluation_data
-            )
+            with db.session.no_autoflush:
+                new_components_data = llm_service.generate_adaptive_batch(
+                    lesson_id=lesson_id,
+                    insights=insights,
+                    recent_telemetry=recent_telemetry,
+                    evaluation_data=evaluation_data
+                )
             
             if new_components_data and isinstance(new_components_data, list):
-                # Validate and add each component in the batch
-                components_added = 0
+                # Validate the batch; order numbers continue from the max read above
                 for comp_data in new_components_data:
                     is_valid, error_msg = llm_service._validate_component(comp_data)
                     if not is_valid:
                         print(f"⚠️ Invalid component in batch: {error_msg}")
                         continue
                     
-                    # Get current count for order
-                    current_order = LessonComponent.query.filter_by(lesson_id=lesson_id).count()
-                    
-                    component = LessonComponent(
+                    new_components.append(LessonComponent(
                         lesson_id=lesson_id,
                         component_type=comp_data['type'],
                         component_data=json.dumps(comp_data['data']),
-                        order=current_order
-                    )
-                    db.session.add(component)
-                    components_added += 1
+                        order=next_order + len(new_components)
+                    ))
                 
-                if components_added > 0:
-                    db.session.commit()
-                    adaptive_component_generated = True
-                    print(f"✓ Added {components_added} adaptive components in batch")
+                if new_components:
+                    print(f"✓ Adding {len(new_components)} adaptive components in batch")
                 else:
                     can_complete = True
                     print("⚠️ No valid components in batch - allowing completion")
@@ -251,9 +282,12 @@ def get_next_component(lesson_id):
             adaptive_reason = "Excellent! You've successfully mastered all learning objectives for this lesson."
             print("✓ Objectives met - lesson can be completed")
     
-    # Recalculate progress with final component count
+    db.session.add_all(new_components)
+    
+    # Update progress with the final component count (known without another query)
     if progress:
-        total_components_after = LessonComponent.query.filter_by(lesson_id=lesson_id).count()
+        progress.current_component_index = current_index + 1
+        total_components_after = total_components_before + len(new_components)
         
         if total_components_after > 0:
             progress.progress_percentage = (current_index + 1) / total_components_after * 100
@@ -262,12 +296,14 @@ def get_next_component(lesson_id):
             if can_complete:
                 progress.completed = True
                 progress.progress_percentage = 100
-        
-        db.session.commit()
+    
+    db.session.commit()
+    if new_components:
+        lesson_cache.invalidate(lesson_id)
     
     return jsonify({
         'message': 'Progress updated',
-        'adaptive_component_generated': adaptive_component_generated,
+        'adaptive_component_generated': bool(new_components),
         'adaptive_reason': adaptive_reason,
         'can_complete': can_complete,
         'evaluation': evaluation_result if evaluation_result else None
@@ -281,9 +317,14 @@ def get_dashboard_data():
     print(f"User ID from token: {user_id}")
     
     # Get latest lesson with progress
-    latest_progress = LessonProgress.query.filter_by(
-        user_id=user_id,
-        completed=False
+    latest_progress = LessonProgress.query.join(
+        Lesson, Lesson.id == LessonProgress.lesson_id
+    ).join(
+        Module, Module.id == Lesson.module_id
+    ).filter(
+        LessonProgress.user_id == user_id,
+        LessonProgress.completed.is_(False),
+        Module.deleted_at.is_(None)
     ).order_by(LessonProgress.last_accessed.desc()).first()
     
     latest_lesson = None
@@ -301,7 +342,7 @@ def get_dashboard_data():
         }
     
     # Get total modules count
-    modules_count = Module.query.filter_by(user_id=user_id).count()
+    modules_count = Module.query.filter_by(user_id=user_id, deleted_at=None).count()
     
     # Get insights
     from models import Insight
@@ -335,7 +376,9 @@ def grade_component(component_id):
     
     # Verify user has access to this component
     lesson = Lesson.query.get(component.lesson_id)
-    module = Module.query.get(lesson.module_id)
+    module = Module.query.filter_by(id=lesson.module_id, deleted_at=None).first()
+    if not module:
+        return jsonify({'error': 'Component not found'}), 404
     if module.user_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
@@ -1,13 +1,25 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User, Module, File, Lesson, db
-from werkzeug.utils import secure_filename
+from models import User, Module, File, Lesson, LearningObjective, LessonProgress, Telemetry, db
 import os
 import zipfile
 import json
+import shutil
 import threading
+from collections import defaultdict
+import time
+from datetime import datetime
 from services.llm_service import LLMService
 from services.vector_service import VectorService
+from services.retrieval_cache import retrieval_cache
+from services.zip_service import ZipIngester, ZipLimitError, storage_filename
+from services.job_queue import job_queue, job_handler, job_failure_handler
+from services.progress_service import progress_store, ProgressReporter
+from services.lesson_cache import lesson_cache
+from services.telemetry_aggregates import remove_aggregates
+from routes.etag import etag_matches, not_modified, json_with_etag
+from sqlalchemy import func
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 
 modules_bp = Blueprint('modules', __name__)
 
@@ -19,54 +31,106 @@ def allowed_file(filename):
 @modules_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_modules():
+    """List modules a page at a time (?limit=, ?cursor= from the X-Next-Cursor header)"""
     user_id = int(get_jwt_identity())
-    modules = Module.query.filter_by(user_id=user_id).all()
+    
+    try:
+        cursor = int(request.args.get('cursor', 0))
+        limit = int(request.args.get('limit', current_app.config['MODULES_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'error': 'cursor and limit must be integers'}), 400
+    limit = max(1, min(limit, current_app.config['MODULES_MAX_PAGE_SIZE']))
+    
+    # Any added, removed or changed module changes one of these
+    count, version_sum, max_id = db.session.query(
+        func.count(Module.id), func.coalesce(func.sum(Module.version), 0), func.max(Module.id)
+    ).filter(Module.user_id == user_id, Module.deleted_at.is_(None)).one()
+    etag = f"modules-{user_id}-{count}-{version_sum}-{max_id}-{cursor}-{limit}"
+    if etag_matches(etag):
+        return not_modified(etag)
+    
+    # One query for the page: only the listed columns, counts as correlated
+    # subqueries (served from the module_id indexes) instead of loading
+    # every File and Lesson row
+    file_count = db.select(func.count(File.id)).where(File.module_id == Module.id).correlate(Module).scalar_subquery()
+    lesson_count = db.select(func.count(Lesson.id)).where(Lesson.module_id == Module.id).correlate(Module).scalar_subquery()
+    rows = db.session.query(
+        Module.id, Module.name, Module.emoji, Module.created_at, Module.processing_status,
+        file_count.label('file_count'), lesson_count.label('lesson_count')
+    ).filter(
+        Module.user_id == user_id,
+        Module.deleted_at.is_(None),
+        Module.id > cursor
+    ).order_by(Module.id).limit(limit + 1).all()
     
     result = []
-    for module in modules:
+    for row in rows[:limit]:
         result.append({
-            'id': module.id,
-            'name': module.name,
-            'emoji': module.emoji,
-            'created_at': module.created_at.isoformat(),
-            'processing_status': module.processing_status,
-            'file_count': len(module.files),
-            'lesson_count': len(module.lessons)
+            'id': row.id,
+            'name': row.name,
+            'emoji': row.emoji,
+            'created_at': row.created_at.isoformat(),
+            'processing_status': row.processing_status,
+            'file_count': row.file_count,
+            'lesson_count': row.lesson_count
         })
     
-    return jsonify(result), 200
+    response = json_with_etag(result, etag)
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = str(result[-1]['id'])
+    return response
 
 @modules_bp.route('/<int:module_id>', methods=['GET'])
 @jwt_required()
 def get_module(module_id):
     user_id = int(get_jwt_identity())
-    module = Module.query.filter_by(id=module_id, user_id=user_id).first()
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
     
     if not module:
         return jsonify({'error': 'Module not found'}), 404
     
+    etag = f"module-{module.id}-{module.version}"
+    if etag_matches(etag):
+        return not_modified(etag)
+    
+    # Fixed number of queries however long the curriculum is:
+    # lessons, then objectives and progress for all of them at once
+    lessons = db.session.query(Lesson.id, Lesson.title, Lesson.lesson_number).filter(
+        Lesson.module_id == module.id
+    ).order_by(Lesson.lesson_number).all()
+    lesson_ids = [lesson.id for lesson in lessons]
+    
+    objectives_by_lesson = defaultdict(list)
+    progress_by_lesson = {}
+    if lesson_ids:
+        objective_rows = db.session.query(LearningObjective.lesson_id, LearningObjective.objective_text).filter(
+            LearningObjective.lesson_id.in_(lesson_ids)
+        ).order_by(LearningObjective.lesson_id, LearningObjective.order)
+        for lesson_id, objective_text in objective_rows:
+            objectives_by_lesson[lesson_id].append(objective_text)
+        
+        progress_rows = LessonProgress.query.filter(
+            LessonProgress.lesson_id.in_(lesson_ids),
+            LessonProgress.user_id == user_id
+        )
+        for progress in progress_rows:
+            progress_by_lesson.setdefault(progress.lesson_id, progress)
+    
     lessons_data = []
-    for lesson in module.lessons:
-        objectives = [obj.objective_text for obj in lesson.objectives]
-        
-        # Get lesson progress for this user
-        from models import LessonProgress
-        progress = LessonProgress.query.filter_by(
-            lesson_id=lesson.id,
-            user_id=user_id
-        ).first()
+    for lesson in lessons:
+        progress = progress_by_lesson.get(lesson.id)
         
         lessons_data.append({
             'id': lesson.id,
             'title': lesson.title,
             'lesson_number': lesson.lesson_number,
-            'objectives': objectives,
+            'objectives': objectives_by_lesson[lesson.id],
             'completed': progress.completed if progress else False,
             'progress_percentage': progress.progress_percentage if progress else 0.0,
             'last_accessed': progress.last_accessed.isoformat() if progress and progress.last_accessed else None
         })
     
-    return jsonify({
+    return json_with_etag({
         'id': module.id,
         'name': module.name,
         'emoji': module.emoji,
@@ -74,22 +138,168 @@ def get_module(module_id):
         'processing_step': module.processing_step,
         'processing_progress': module.processing_progress,
         'lessons': lessons_data
-    }), 200
+    }, etag)
 
 @modules_bp.route('/<int:module_id>/status', methods=['GET'])
 @jwt_required()
 def get_module_status(module_id):
     user_id = int(get_jwt_identity())
-    module = Module.query.filter_by(id=module_id, user_id=user_id).first()
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
     
     if not module:
         return jsonify({'error': 'Module not found'}), 404
     
-    return jsonify({
+    # Live progress comes from the progress store; the row is only a throttled copy
+    live = progress_store.get(module.id)
+    if live:
+        etag = f"status-{module.id}-{int(live['updated_at'] * 1000)}"
+        if etag_matches(etag):
+            return not_modified(etag)
+        return json_with_etag({
+            'processing_status': live['processing_status'],
+            'processing_step': live['processing_step'],
+            'processing_progress': live['processing_progress']
+        }, etag)
+    
+    etag = f"status-{module.id}-v{module.version}"
+    if etag_matches(etag):
+        return not_modified(etag)
+    return json_with_etag({
         'processing_status': module.processing_status,
         'processing_step': module.processing_step or 'Waiting to start...',
         'processing_progress': module.processing_progress or 0
-    }), 200
+    }, etag)
+
+# Open event streams per user in this process; each one holds a server thread
+_open_streams = defaultdict(int)
+_open_streams_lock = threading.Lock()
+
+def _stream_serializer():
+    # The salt makes these tokens useless anywhere but the event stream
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='module-events')
+
+@modules_bp.route('/<int:module_id>/events/token', methods=['POST'])
+@jwt_required()
+def module_events_token(module_id):
+    """Short-lived token for the event stream of one module.
+    
+    EventSource cannot set headers, so the stream takes its credentials from
+    the URL; this keeps the access token itself out of URLs and server logs.
+    """
+    user_id = int(get_jwt_identity())
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
+    
+    if not module:
+        return jsonify({'error': 'Module not found'}), 404
+    
+    token = _stream_serializer().dumps({'user_id': user_id, 'module_id': module.id})
+    return jsonify({'token': token, 'expires_in': current_app.config['SSE_TOKEN_SECONDS']}), 200
+
+@modules_bp.route('/<int:module_id>/events', methods=['GET'])
+def module_events(module_id):
+    """Server-sent events stream of processing progress.
+    
+    Authenticated with ?token= from POST /events/token. A state is sent only
+    when it changes; its id is the store's update time, so a reconnect with
+    Last-Event-ID does not repeat it. Terminal states (completed/error) are
+    always sent so the client knows to close.
+    """
+    try:
+        claims = _stream_serializer().loads(request.args.get('token', ''), max_age=current_app.config['SSE_TOKEN_SECONDS'])
+    except BadSignature:
+        return jsonify({'error': 'Invalid or expired stream token'}), 401
+    if claims.get('module_id') != module_id:
+        return jsonify({'error': 'Invalid or expired stream token'}), 401
+    
+    user_id = claims['user_id']
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
+    
+    if not module:
+        return jsonify({'error': 'Module not found'}), 404
+    
+    with _open_streams_lock:
+        if _open_streams[user_id] >= current_app.config['SSE_MAX_STREAMS_PER_USER']:
+            return jsonify({'error': 'Too many open event streams'}), 429
+        _open_streams[user_id] += 1
+    
+    def release():
+        with _open_streams_lock:
+            _open_streams[user_id] -= 1
+            if not _open_streams[user_id]:
+                del _open_streams[user_id]
+    
+    fallback = {
+        'processing_status': module.processing_status,
+        'processing_step': module.processing_step or 'Waiting to start...',
+        'processing_progress': module.processing_progress or 0,
+        'updated_at': 0
+    }
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    poll_interval = current_app.config['SSE_POLL_INTERVAL']
+    heartbeat_interval = current_app.config['SSE_HEARTBEAT_SECONDS']
+    max_duration = current_app.config['SSE_MAX_STREAM_SECONDS']
+    
+    def stream():
+        sent_id = last_event_id
+        started = last_write = time.monotonic()
+        yield "retry: 2000\n\n"
+        
+        # Everything below only reads the progress store (a stat per poll), never the database
+        while True:
+            state = progress_store.get(module_id) or fallback
+            event_id = str(int(state['updated_at'] * 1000))
+            terminal = state['processing_status'] in ('completed', 'error')
+            
+            if event_id != sent_id or terminal:
+                data = json.dumps({
+                    'processing_status': state['processing_status'],
+                    'processing_step': state['processing_step'],
+                    'processing_progress': state['processing_progress']
+                })
+                yield f"id: {event_id}\ndata: {data}\n\n"
+                sent_id = event_id
+                last_write = time.monotonic()
+            
+            if terminal:
+                return
+            
+            now = time.monotonic()
+            # Bounded streams; the browser reconnects with Last-Event-ID
+            if now - started >= max_duration:
+                return
+            if now - last_write >= heartbeat_interval:
+                yield ": heartbeat\n\n"
+                last_write = now
+            
+            time.sleep(poll_interval)
+    
+    response = Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(release)
+    return response
+
+@modules_bp.route('/<int:module_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_module(module_id):
+    """Re-run processing for a failed module, skipping work that already completed"""
+    user_id = int(get_jwt_identity())
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
+    
+    if not module:
+        return jsonify({'error': 'Module not found'}), 404
+    
+    if module.processing_status == 'processing':
+        return jsonify({'error': 'Module is already processing'}), 409
+    
+    start_module_processing(module)
+    
+    return jsonify({
+        'id': module.id,
+        'processing_status': module.processing_status,
+        'processing_stage': module.processing_stage
+    }), 202
 
 @modules_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -114,56 +324,27 @@ def create_module():
         upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(module.id))
         os.makedirs(upload_folder, exist_ok=True)
         
-        for file in files:
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(upload_folder, filename)
-                file.save(file_path)
-                
-                # Extract zip files
-                if filename.endswith('.zip'):
-                    extract_folder = os.path.join(upload_folder, 'extracted')
-                    os.makedirs(extract_folder, exist_ok=True)
-                    with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                        zip_ref.extractall(extract_folder)
-                    
-                    # Process extracted files
-                    for root, dirs, files_in_zip in os.walk(extract_folder):
-                        for file_in_zip in files_in_zip:
-                            if allowed_file(file_in_zip) and not file_in_zip.endswith('.zip'):
-                                extracted_path = os.path.join(root, file_in_zip)
-                                file_type = file_in_zip.rsplit('.', 1)[1].lower()
-                                file_obj = File(
-                                    filename=file_in_zip,
-                                    file_path=extracted_path,
-                                    file_type=file_type,
-                                    module_id=module.id
-                                )
-                                db.session.add(file_obj)
-                else:
-                    file_type = filename.rsplit('.', 1)[1].lower()
-                    file_obj = File(
-                        filename=filename,
-                        file_path=file_path,
-                        file_type=file_type,
-                        module_id=module.id
-                    )
-                    db.session.add(file_obj)
+        try:
+            for file in files:
+                if file and allowed_file(file.filename):
+                    for file_obj in save_upload(file, file.filename, module.id, upload_folder):
+                        db.session.add(file_obj)
+        except Exception as e:
+            # Don't leave a module behind with half of its files
+            print(f"❌ Rejected upload for module {module.id}: {e}")
+            db.session.rollback()
+            db.session.delete(module)
+            db.session.commit()
+            shutil.rmtree(upload_folder, ignore_errors=True)
+            if isinstance(e, (ZipLimitError, zipfile.BadZipFile)):
+                return jsonify({'error': f'Invalid archive: {str(e)}'}), 400
+            raise
         
         db.session.commit()
         
         # Start processing in background thread
         if files:
-            module.processing_status = 'processing'
-            module.processing_step = 'Queued for processing...'
-            module.processing_progress = 0
-            db.session.commit()
-            
-            # Run processing in background thread
-            thread = threading.Thread(target=process_module_background, args=(current_app._get_current_object(), module.id))
-            thread.daemon = True
-            thread.start()
-            print(f"Started background processing for module {module.id}")
+            start_module_processing(module)
     
     return jsonify({
         'id': module.id,
@@ -172,11 +353,67 @@ def create_module():
         'processing_status': module.processing_status
     }), 201
 
+def save_upload(stream, filename, module_id, upload_folder):
+    """Store one uploaded file (or each member of a zip) and yield unsaved File rows"""
+    filename = storage_filename(filename)
+    file_type = filename.rsplit('.', 1)[1]
+    
+    if file_type == 'zip':
+        # Members are streamed straight out of the upload; the archive itself is never written
+        ingester = ZipIngester(
+            upload_folder,
+            ALLOWED_EXTENSIONS,
+            max_total_bytes=current_app.config['ZIP_MAX_TOTAL_BYTES'],
+            max_member_bytes=current_app.config['ZIP_MAX_MEMBER_BYTES'],
+            max_ratio=current_app.config['ZIP_MAX_RATIO'],
+            max_members=current_app.config['ZIP_MAX_MEMBERS']
+        )
+        zip_source = stream.stream if hasattr(stream, 'stream') else stream
+        for member_name, member_path, member_type in ingester.ingest(zip_source):
+            yield File(filename=member_name, file_path=member_path, file_type=member_type, module_id=module_id)
+        return
+    
+    file_path = os.path.join(upload_folder, filename)
+    stream.save(file_path)
+    yield File(filename=filename, file_path=file_path, file_type=file_type, module_id=module_id)
+
+def save_assembled_upload(temp_path, filename, module_id, upload_folder):
+    """Move a fully received resumable upload into module storage and yield File rows"""
+    filename = storage_filename(filename)
+    file_type = filename.rsplit('.', 1)[1]
+    
+    if file_type == 'zip':
+        with open(temp_path, 'rb') as zip_stream:
+            yield from save_upload(zip_stream, filename, module_id, upload_folder)
+        os.remove(temp_path)
+        return
+    
+    file_path = os.path.join(upload_folder, filename)
+    base, ext = os.path.splitext(file_path)
+    counter = 1
+    while os.path.exists(file_path):
+        file_path = f"{base}_{counter}{ext}"
+        counter += 1
+    
+    os.replace(temp_path, file_path)
+    yield File(filename=filename, file_path=file_path, file_type=file_type, module_id=module_id)
+
+def start_module_processing(module):
+    """Mark a module as queued and submit it to the job queue"""
+    module.processing_status = 'processing'
+    module.processing_step = 'Queued for processing...'
+    module.processing_progress = 0
+    db.session.commit()
+    progress_store.set(module.id, 'processing', module.processing_step, 0, module.processing_stage)
+    
+    job = job_queue.enqueue('process_module', {'module_id': module.id}, dedupe_key=f"module:{module.id}")
+    print(f"Queued processing for module {module.id} (job {job.id})")
+
 @modules_bp.route('/<int:module_id>', methods=['PUT'])
 @jwt_required()
 def update_module(module_id):
     user_id = int(get_jwt_identity())
-    module = Module.query.filter_by(id=module_id, user_id=user_id).first()
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
     
     if not module:
         return jsonify({'error': 'Module not found'}), 404
@@ -200,228 +437,286 @@ def update_module(module_id):
 @jwt_required()
 def delete_module(module_id):
     user_id = int(get_jwt_identity())
-    module = Module.query.filter_by(id=module_id, user_id=user_id).first()
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
     
     if not module:
         return jsonify({'error': 'Module not found'}), 404
     
-    try:
-        # Import all models needed for cascade delete
-        from models import (
-            Lesson, LearningObjective, LessonComponent, 
-            LessonProgress, Telemetry, Insight, File
-        )
-        
-        # Delete in correct order to respect foreign key constraints
-        
-        # 1. Get all lessons for this module
-        lessons = Lesson.query.filter_by(module_id=module_id).all()
-        lesson_ids = [lesson.id for lesson in lessons]
-        
-        # 2. Delete telemetry for these lessons
-        Telemetry.query.filter(Telemetry.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
-        print(f"Deleted telemetry for {len(lesson_ids)} lessons")
-        
-        # 3. Delete lesson progress for these lessons
-        LessonProgress.query.filter(LessonProgress.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
-        print(f"Deleted progress for {len(lesson_ids)} lessons")
-        
-        # 4. Delete lesson components for these lessons
-        LessonComponent.query.filter(LessonComponent.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
-        print(f"Deleted components for {len(lesson_ids)} lessons")
-        
-        # 5. Delete learning objectives for these lessons
-        LearningObjective.query.filter(LearningObjective.lesson_id.in_(lesson_ids)).delete(synchronize_session=False)
-        print(f"Deleted objectives for {len(lesson_ids)} lessons")
-        
-        # 6. Delete lessons
-        Lesson.query.filter_by(module_id=module_id).delete(synchronize_session=False)
-        print(f"Deleted {len(lesson_ids)} lessons")
-        
-        # 7. Delete insights related to this module (optional - based on your data model)
-        # If insights are module-specific, delete them. Otherwise skip this step.
-        
-        # 8. Delete files associated with this module
-        files = File.query.filter_by(module_id=module_id).all()
-        for file in files:
-            # Delete file from vector database if it has a vector_id
-            if file.vector_id:
-                try:
-                    from services.vector_service import VectorService
-                    vector_service = VectorService()
-                    # Delete from vector DB (implement this method if not exists)
-                    print(f"Deleting vector data for file {file.filename}")
-                except Exception as e:
-                    print(f"Warning: Could not delete vector data: {e}")
-        
-        File.query.filter_by(module_id=module_id).delete(synchronize_session=False)
-        print(f"Deleted {len(files)} files")
-        
-        # 11. Delete files from filesystem
-        upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(module_id))
-        if os.path.exists(upload_folder):
-            import shutil
-            shutil.rmtree(upload_folder)
-            print(f"Deleted upload folder: {upload_folder}")
-        
-        # 12. Finally delete the module itself
-        db.session.delete(module)
-        
-        # Commit all deletes
-        db.session.commit()
-        print(f"✓ Successfully deleted module {module_id} and all related data")
-        
-        return jsonify({'message': 'Module and all related data deleted successfully'}), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Error deleting module: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': f'Failed to delete module: {str(e)}'}), 500
+    # Hide the module right away; rows, uploads and vectors are removed by the
+    # purge_module job, so this request costs the same for any module size
+    module.deleted_at = datetime.utcnow()
+    db.session.commit()
+    job_queue.enqueue('purge_module', {'module_id': module_id}, dedupe_key=f"purge:{module_id}")
+    print(f"🗑️  Module {module_id} marked for deletion")
+    
+    return jsonify({'message': 'Module deleted'}), 202
 
-def process_module_background(app, module_id):
-    """Background thread function to process module with app context"""
-    with app.app_context():
-        try:
-            process_module(module_id)
-        except Exception as e:
-            print(f"Background processing error: {e}")
-            import traceback
-            traceback.print_exc()
+@job_handler('purge_module')
+def purge_module_job(payload):
+    """Remove a module marked deleted, with everything that belongs to it"""
+    module_id = payload['module_id']
+    if Module.query.get(module_id) is None:
+        print(f"Module {module_id} already purged")
+        return
+    
+    lesson_ids = [row.id for row in db.session.query(Lesson.id).filter_by(module_id=module_id)]
+    vector_file_ids = [row.id for row in db.session.query(File.id).filter(
+        File.module_id == module_id, File.vector_id.isnot(None)
+    )]
+    
+    # Everything outside the database goes first: if any of it fails the job is
+    # retried and finds the row still there, so nothing is left orphaned
+    retrieval_cache.invalidate_module(module_id)
+    lesson_cache.invalidate_many(lesson_ids)
+    progress_store.clear(module_id)
+    
+    upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(module_id))
+    if os.path.exists(upload_folder):
+        shutil.rmtree(upload_folder)
+        print(f"Deleted upload folder: {upload_folder}")
+    
+    # Vector data goes in its own job so a failure there is retried without redoing the above
+    if vector_file_ids:
+        job_queue.enqueue('delete_vectors', {'file_ids': vector_file_ids}, dedupe_key=f"vectors:{module_id}")
+    
+    # Telemetry is deleted explicitly so the rows removed (RETURNING, nothing
+    # inserted meanwhile is missed) come back out of the per-user aggregates
+    # in the same transaction
+    telemetry = Telemetry.__table__
+    for start in range(0, len(lesson_ids), 500):
+        removed_events = db.session.execute(
+            telemetry.delete()
+            .where(telemetry.c.lesson_id.in_(lesson_ids[start:start + 500]))
+            .returning(telemetry.c.user_id, telemetry.c.event_type, telemetry.c.event_data)
+        ).mappings().all()
+        remove_aggregates(db.session, removed_events)
+    
+    # Lessons, objectives, components, progress, files and upload sessions
+    # go with it through ON DELETE CASCADE
+    Module.query.filter_by(id=module_id).delete(synchronize_session=False)
+    db.session.commit()
+    print(f"✓ Deleted module {module_id} with {len(lesson_ids)} lessons")
+
+@job_handler('delete_vectors')
+def delete_vectors_job(payload):
+    """Drop vector chunks for deleted files"""
+    file_ids = payload['file_ids']
+    vector_service = VectorService()
+    deleted = vector_service.delete_files(file_ids)
+    db.session.commit()
+    print(f"✓ Deleted vector data for {deleted}/{len(file_ids)} files")
+
+@job_handler('process_module')
+def process_module_job(payload):
+    """Run (or resume) the processing pipeline for one module"""
+    module = Module.query.get(payload['module_id'])
+    if module is None or module.deleted_at is not None:
+        print(f"Module {payload['module_id']} no longer exists, skipping")
+        return
+    process_module(payload['module_id'])
+
+@job_failure_handler('process_module')
+def process_module_failed(payload, error):
+    """Don't leave a module 'processing' once its job has given up (e.g. its workers kept dying)"""
+    module = Module.query.get(payload['module_id'])
+    if module is None or module.processing_status != 'processing':
+        return
+    module.processing_status = 'error'
+    module.processing_step = f'Error: {error}'
+    db.session.commit()
+    progress_store.set(module.id, 'error', module.processing_step, module.processing_progress or 0, module.processing_stage)
 
 def process_module(module_id):
-    """Process module files and generate weeks, lessons, and objectives"""
+    """Process module files and generate lessons and objectives.
+    
+    The pipeline runs as explicit stages with checkpoints stored on the rows
+    themselves (File.extracted, File.vector_id, File.summary, existing lessons,
+    objectives and components). Running it again after a crash therefore only
+    does the unfinished work.
+    """
     module = Module.query.get(module_id)
-    module.processing_status = 'processing'
-    module.processing_step = 'Initializing...'
-    module.processing_progress = 0
-    db.session.commit()
+    progress = ProgressReporter(module, flush_interval=current_app.config.get('PROGRESS_FLUSH_INTERVAL', 5))
+    progress.start('Initializing...')
     
     try:
         llm_service = LLMService()
         vector_service = VectorService()
         
-        # Calculate total steps for smooth progress
-        files = File.query.filter_by(module_id=module_id).all()
-        total_files = len(files)
-        print(f"Found {total_files} files to process")
+        files = File.query.filter_by(module_id=module_id).order_by(File.id).all()
+        print(f"Found {len(files)} files to process")
         
-        if total_files == 0:
-            module.processing_step = 'No files to process'
-            module.processing_progress = 100
-            module.processing_status = 'completed'
-            db.session.commit()
+        if not files:
+            progress.finish('No files to process')
             return
         
         # Progress allocation:
-        # 0-30%: File processing and embedding
-        # 30-50%: Curriculum generation
-        # 50-100%: Objectives for each lesson (distributed across lessons)
-        
-        # Step 1: Store files in vector database (0-30%)
-        module.processing_step = 'Processing and embedding files...'
-        db.session.commit()
-        
-        for idx, file in enumerate(files):
-            print(f"Processing file {idx + 1}/{total_files}: {file.filename}")
-            vector_id = vector_service.add_file(file.file_path, file.id)
-            file.vector_id = vector_id
-            progress = int((idx + 1) / total_files * 30)
-            module.processing_progress = progress
-            module.processing_step = f'Processing files ({idx + 1}/{total_files})...'
-            db.session.commit()
-        
-        print("File embedding complete, generating curriculum...")
-        
-        # Step 2: Generate lessons structure (30-50%)
-        module.processing_step = 'Analyzing content and generating curriculum...'
-        module.processing_progress = 30
-        db.session.commit()
-        
-        lessons_data = llm_service.generate_curriculum(module_id, files)
-        print(f"Generated {len(lessons_data)} lessons")
-        
-        if not lessons_data or len(lessons_data) == 0:
+        # 0-15%: Text extraction
+        # 15-30%: Embedding
+        # 30-40%: Per-file summaries
+        # 40-50%: Curriculum generation
+        # 50-100%: Objectives for each lesson (50-90% if lessons are pre-generated)
+        _stage_extract(module, files, vector_service, progress)
+        _stage_embed(module, files, vector_service, progress)
+        _stage_summarize(module, files, llm_service, progress)
+        
+        lessons = _stage_curriculum(module, files, llm_service, progress)
+        if not lessons:
             print("WARNING: No lessons data generated, completing with empty state")
-            module.processing_step = 'Completed (no lessons generated)'
-            module.processing_progress = 100
-            module.processing_status = 'completed'
-            db.session.commit()
+            progress.finish('Completed (no lessons generated)')
             return
         
-        module.processing_progress = 50
+        pregenerate = current_app.config.get('PREGENERATE_LESSONS', False)
+        _stage_objectives(module, lessons, llm_service, progress, 90 if pregenerate else 100)
+        if pregenerate:
+            _stage_pregenerate(module, lessons, llm_service, progress)
+        
+        progress.finish('Completed!')
+    
+    except Exception as e:
+        print(f"Error in process_module (stage {progress.stage}): {e}")
+        import traceback
+        traceback.print_exc()
+        db.session.rollback()
+        progress.finish(f'Error: {str(e)}', status='error', stage=progress.stage, progress=progress.progress)
+        raise
+
+def _stage_extract(module, files, vector_service, progress):
+    """Stage 1: extract and chunk every file not yet extracted (0-15%)"""
+    total_files = len(files)
+    progress.update('Extracting text from files...', 0, 'extract')
+    
+    for idx, file in enumerate(files):
+        if file.extracted or file.vector_id:
+            continue
+        print(f"Extracting file {idx + 1}/{total_files}: {file.filename}")
+        vector_service.extract_file(file.file_path, file.id)
+        file.extracted = True
+        db.session.commit()
+        progress.update(f'Extracting files ({idx + 1}/{total_files})...', (idx + 1) / total_files * 15)
+
+def _stage_embed(module, files, vector_service, progress):
+    """Stage 2: embed every extracted file not yet embedded (15-30%)"""
+    total_files = len(files)
+    progress.update('Embedding files...', 15, 'embed')
+    
+    for idx, file in enumerate(files):
+        if file.vector_id:
+            continue
+        print(f"Embedding file {idx + 1}/{total_files}: {file.filename}")
+        file.vector_id = vector_service.embed_file(file.id)
         db.session.commit()
+        progress.update(f'Embedding files ({idx + 1}/{total_files})...', 15 + (idx + 1) / total_files * 15)
+
+def _stage_summarize(module, files, llm_service, progress):
+    """Stage 3: summarize each file once (30-40%); summaries feed the curriculum prompt"""
+    # Summaries are only read by the curriculum stage
+    if Lesson.query.filter_by(module_id=module.id).first() is not None:
+        print("Curriculum already generated, skipping summaries")
+        return
+    
+    progress.update('Summarizing files...', 30, 'summarize')
+    
+    # None means not summarized yet; a file without text gets "" so it isn't retried
+    pending = [file for file in files if file.summary is None]
+    if pending:
+        summaries = llm_service.summarize_files(pending)
+        for file in pending:
+            file.summary = summaries.get(file.id) or ''
+        db.session.commit()
+
+def _stage_curriculum(module, files, llm_service, progress):
+    """Stage 4: generate the lesson structure once (40-50%)"""
+    lessons = Lesson.query.filter_by(module_id=module.id).order_by(Lesson.lesson_number).all()
+    if lessons:
+        print(f"Curriculum already generated ({len(lessons)} lessons), skipping")
+        return lessons
+    
+    progress.update('Analyzing content and generating curriculum...', 40, 'curriculum')
+    
+    lessons_data = llm_service.generate_curriculum(module.id, files)
+    print(f"Generated {len(lessons_data)} lessons")
+    
+    # All lessons are written in one commit so a crash never leaves half a curriculum
+    for lesson_info in lessons_data:
+        lesson = Lesson(
+            title=lesson_info['title'],
+            module_id=module.id,
+            lesson_number=lesson_info['lesson_number'],
+            plan=lesson_info.get('plan', ''),
+            file_ids=json.dumps(lesson_info.get('file_ids', []))
+        )
+        db.session.add(lesson)
+    
+    db.session.commit()
+    progress.update('Curriculum generated', 50)
+    
+    return Lesson.query.filter_by(module_id=module.id).order_by(Lesson.lesson_number).all()
+
+def _stage_objectives(module, lessons, llm_service, progress, end_progress=100):
+    """Stage 5: generate objectives for each lesson that has none (50-end_progress%)"""
+    from models import LearningObjective
+    
+    total_lessons = len(lessons)
+    progress_per_lesson = (end_progress - 50) / total_lessons
+    
+    for lesson_idx, lesson in enumerate(lessons):
+        base_progress = 50 + (lesson_idx * progress_per_lesson)
         
-        # Step 3: Process each lesson with objectives (50-100%)
-        total_lessons = len(lessons_data)
-        progress_per_lesson = 50 / total_lessons  # 50% total divided by number of lessons
+        if LearningObjective.query.filter_by(lesson_id=lesson.id).count() > 0:
+            continue
         
-        for lesson_idx, lesson_info in enumerate(lessons_data):
-            print(f"Processing lesson {lesson_idx + 1}/{total_lessons}: {lesson_info.get('title', 'Untitled')}")
-            
-            # Create lesson
-            base_progress = 50 + (lesson_idx * progress_per_lesson)
-            module.processing_step = f'Creating lesson {lesson_idx + 1} of {total_lessons}...'
-            module.processing_progress = int(base_progress)
-            db.session.commit()
-            
-            lesson = Lesson(
-                title=lesson_info['title'],
-                module_id=module_id,
-                lesson_number=lesson_info['lesson_number'],
-                plan=lesson_info.get('plan', ''),
-                file_ids=json.dumps(lesson_info.get('file_ids', []))
+        print(f"Processing lesson {lesson_idx + 1}/{total_lessons}: {lesson.title}")
+        progress.update(f'Generating objectives for lesson {lesson_idx + 1} of {total_lessons}...', base_progress, 'objectives')
+        
+        file_ids = json.loads(lesson.file_ids) if lesson.file_ids else []
+        print(f"Calling generate_objectives for lesson {lesson.id} with file_ids: {file_ids}")
+        try:
+            objectives = llm_service.generate_objectives(lesson.id, file_ids)
+            print(f"Generated {len(objectives)} objectives for lesson {lesson_idx + 1}")
+        except Exception as e:
+            print(f"⚠️ Error generating objectives for lesson {lesson_idx + 1}: {e}")
+            # Use fallback objectives
+            objectives = [
+                f"Understand the key concepts in {lesson.title}",
+                f"Apply knowledge from {lesson.title}",
+                f"Practice skills related to {lesson.title}"
+            ]
+            print(f"Using fallback objectives: {objectives}")
+        
+        # Add objectives to lesson; this commit is the lesson's checkpoint
+        for idx, obj_text in enumerate(objectives):
+            objective = LearningObjective(
+                lesson_id=lesson.id,
+                objective_text=obj_text,
+                order=idx
             )
-            db.session.add(lesson)
-            db.session.commit()
-            
-            # Generate objectives for this lesson
-            module.processing_step = f'Generating objectives for lesson {lesson_idx + 1}...'
-            module.processing_progress = int(base_progress + progress_per_lesson * 0.5)
-            db.session.commit()
-            
-            print(f"Calling generate_objectives for lesson {lesson.id} with file_ids: {lesson_info.get('file_ids', [])}")
-            try:
-                objectives = llm_service.generate_objectives(lesson.id, lesson_info.get('file_ids', []))
-                print(f"Generated {len(objectives)} objectives for lesson {lesson_idx + 1}")
-            except Exception as e:
-                print(f"⚠️ Error generating objectives for lesson {lesson_idx + 1}: {e}")
-                # Use fallback objectives
-                objectives = [
-                    f"Understand the key concepts in {lesson_info['title']}",
-                    f"Apply knowledge from {lesson_info['title']}",
-                    f"Practice skills related to {lesson_info['title']}"
-                ]
-                print(f"Using fallback objectives: {objectives}")
-            
-            # Add objectives to lesson
-            from models import LearningObjective
-            for idx, obj_text in enumerate(objectives):
-                objective = LearningObjective(
-                    lesson_id=lesson.id,
-                    objective_text=obj_text,
-                    order=idx
-                )
-                db.session.add(objective)
-            
-            db.session.commit()
-            
-            # Update progress at end of lesson
-            module.processing_progress = int(base_progress + progress_per_lesson)
-            db.session.commit()
+            db.session.add(objective)
         
-        module.processing_step = 'Completed!'
-        module.processing_progress = 100
-        module.processing_status = 'completed'
         db.session.commit()
+        lesson_cache.invalidate(lesson.id)
+
+def _stage_pregenerate(module, lessons, llm_service, progress):
+    """Optional stage 6: generate the initial components of every lesson (90-100%)"""
+    from models import LessonComponent
+    from routes.lessons import save_generated_components
+    from services.telemetry_service import TelemetryService
+    
+    insights = TelemetryService().get_user_insights(module.user_id)
+    total_lessons = len(lessons)
+    
+    for lesson_idx, lesson in enumerate(lessons):
+        if LessonComponent.query.filter_by(lesson_id=lesson.id).count() > 0:
+            continue
         
-    except Exception as e:
-        print(f"Error in process_module: {e}")
-        import traceback
-        traceback.print_exc()
-        module.processing_status = 'error'
-        module.processing_step = f'Error: {str(e)}'
-        module.processing_progress = 0
+        progress.update(f'Preparing lesson {lesson_idx + 1} of {total_lessons}...', 90 + lesson_idx / total_lessons * 10, 'pregenerate')
+        components_data = llm_service.generate_lesson_components(lesson_id=lesson.id, insights=insights)
+        save_generated_components(lesson.id, components_data, llm_service)
         db.session.commit()
-        raise
+
+def resume_interrupted_modules(app):
+    """Queue modules left in 'processing' without a live job (e.g. from before a crash)"""
+    with app.app_context():
+        interrupted = Module.query.filter_by(processing_status='processing', deleted_at=None).all()
+        for module in interrupted:
+            print(f"Resuming interrupted processing for module {module.id} (stage {module.processing_stage})")
+            job_queue.enqueue('process_module', {'module_id': module.id}, dedupe_key=f"module:{module.id}")
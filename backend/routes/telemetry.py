@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Telemetry, db
+from models import Telemetry, Lesson, LessonComponent, Module, db
+from services.telemetry_buffer import telemetry_buffer
+from services.telemetry_aggregates import record_aggregates
+from datetime import datetime, timezone
 import json
 
 telemetry_bp = Blueprint('telemetry', __name__)
@@ -9,25 +12,90 @@ telemetry_bp = Blueprint('telemetry', __name__)
 @jwt_required()
 def track_event():
     user_id = int(get_jwt_identity())
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON object required'}), 400
     
     lesson_id = data.get('lesson_id')
     component_id = data.get('component_id')
     event_type = data.get('event_type')
     event_data = data.get('event_data', {})
     
-    if not lesson_id or not event_type:
-        return jsonify({'error': 'lesson_id and event_type required'}), 400
+    # Checked here because the row is only inserted later, by the buffer's flush
+    if type(lesson_id) is not int or not isinstance(event_type, str) or not event_type:
+        return jsonify({'error': 'lesson_id (integer) and event_type (string) required'}), 400
+    if component_id is not None and type(component_id) is not int:
+        return jsonify({'error': 'component_id must be an integer'}), 400
     
-    telemetry = Telemetry(
+    # Buffered: inserted in bulk by a background thread, not committed per request
+    telemetry_buffer.add(
         user_id=user_id,
         lesson_id=lesson_id,
         component_id=component_id,
-        event_type=event_type,
+        event_type=event_type[:100],
         event_data=json.dumps(event_data)
     )
     
-    db.session.add(telemetry)
-    db.session.commit()
-    
     return jsonify({'message': 'Event tracked'}), 201
+
+def _event_timestamp(value, now):
+    """Client timestamp as naive UTC; missing, invalid or future values become now"""
+    try:
+        timestamp = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return now
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(timestamp, now)
+
+@telemetry_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def track_batch():
+    """Store a buffered batch of events in one transaction"""
+    user_id = int(get_jwt_identity())
+    data = request.get_json(force=True, silent=True) or {}
+    events = data.get('events')
+    
+    if not isinstance(events, list):
+        return jsonify({'error': 'events array required'}), 400
+    
+    if len(events) > current_app.config['TELEMETRY_MAX_BATCH']:
+        return jsonify({'error': f"At most {current_app.config['TELEMETRY_MAX_BATCH']} events per batch"}), 413
+    
+    events = [e for e in events if isinstance(e, dict) and isinstance(e.get('lesson_id'), int) and e.get('event_type')]
+    
+    # Only the user's own lessons and their components; one query each for the whole batch
+    lesson_ids = {e['lesson_id'] for e in events}
+    own_lessons = {row.id for row in db.session.query(Lesson.id).join(Module, Module.id == Lesson.module_id).filter(
+        Lesson.id.in_(lesson_ids), Module.user_id == user_id, Module.deleted_at.is_(None)
+    )} if lesson_ids else set()
+    component_ids = {e['component_id'] for e in events if isinstance(e.get('component_id'), int)}
+    component_lessons = dict(db.session.query(LessonComponent.id, LessonComponent.lesson_id).filter(
+        LessonComponent.id.in_(component_ids)
+    ).all()) if component_ids else {}
+    
+    now = datetime.utcnow()
+    rows = []
+    for event in events:
+        if event['lesson_id'] not in own_lessons:
+            continue
+        component_id = event.get('component_id') if isinstance(event.get('component_id'), int) else None
+        rows.append({
+            'user_id': user_id,
+            'lesson_id': event['lesson_id'],
+            'component_id': component_id if component_lessons.get(component_id) == event['lesson_id'] else None,
+            'event_type': str(event['event_type'])[:100],
+            'event_data': json.dumps(event.get('event_data') or {}),
+            'timestamp': _event_timestamp(event.get('client_timestamp'), now)
+        })
+    
+    if rows:
+        db.session.execute(db.insert(Telemetry), rows)
+        record_aggregates(db.session, rows)
+        db.session.commit()
+    
+    return jsonify({
+        'message': 'Events tracked',
+        'accepted': len(rows),
+        'rejected': len(data['events']) - len(rows)
+    }), 201
@@ -0,0 +1,260 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import Lesson, Module, UploadSession, db
+from routes.modules import allowed_file, save_assembled_upload, start_module_processing
+from services.job_queue import job_handler
+from services.zip_service import ZipLimitError
+from datetime import datetime, timedelta
+import glob
+import hashlib
+import os
+import time
+import uuid
+import zipfile
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Resumable upload protocol:
+#   POST /api/uploads/                     {module_id, filename, total_size, sha256?} -> upload_id
+#   PUT  /api/uploads/<id>                 raw chunk body, Upload-Offset header, optional X-Chunk-SHA256
+#   GET  /api/uploads/<id>                 current offset, to resume after a dropped connection
+#   POST /api/uploads/<id>/finalize        {process?} -> registers the file and starts processing
+#
+# Files can only be added while a module has no lessons yet. Processing resumes
+# from checkpoints and never regenerates an existing curriculum, so a file added
+# later would be embedded but never reach a lesson; such uploads get a 409.
+# The same goes while the module is processing: the running job has already
+# read its file list. Sessions left unfinished are removed by the
+# expire_uploads maintenance job after UPLOAD_SESSION_TTL.
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+def _get_session(upload_id, user_id):
+    return UploadSession.query.filter_by(id=upload_id, user_id=user_id).first()
+
+def _has_curriculum(module):
+    return Lesson.query.filter_by(module_id=module.id).first() is not None
+
+def _session_json(upload):
+    return {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'total_size': upload.total_size,
+        'offset': upload.received_bytes,
+        'status': upload.status
+    }
+
+@uploads_bp.route('/', methods=['POST'])
+@jwt_required()
+def init_upload():
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    
+    module_id = data.get('module_id')
+    filename = data.get('filename')
+    total_size = data.get('total_size')
+    
+    if not module_id or not filename or not isinstance(total_size, int) or total_size <= 0:
+        return jsonify({'error': 'module_id, filename and a positive total_size required'}), 400
+    
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    if total_size > current_app.config['RESUMABLE_UPLOAD_MAX_BYTES']:
+        return jsonify({'error': 'File too large'}), 413
+    
+    module = Module.query.filter_by(id=module_id, user_id=user_id, deleted_at=None).first()
+    if not module:
+        return jsonify({'error': 'Module not found'}), 404
+    
+    if _has_curriculum(module):
+        return jsonify({'error': 'Module already has lessons; create a new module for more files'}), 409
+    
+    if module.processing_status == 'processing':
+        return jsonify({'error': 'Module is being processed; add files once it has finished'}), 409
+    
+    upload_id = uuid.uuid4().hex
+    partial_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(module.id), '.partial')
+    os.makedirs(partial_folder, exist_ok=True)
+    temp_path = os.path.join(partial_folder, upload_id)
+    open(temp_path, 'wb').close()
+    
+    upload = UploadSession(
+        id=upload_id,
+        user_id=user_id,
+        module_id=module.id,
+        filename=filename,
+        total_size=total_size,
+        received_bytes=0,
+        checksum=data.get('sha256'),
+        temp_path=temp_path
+    )
+    db.session.add(upload)
+    db.session.commit()
+    
+    result = _session_json(upload)
+    result['chunk_size'] = current_app.config['RESUMABLE_UPLOAD_CHUNK_SIZE']
+    return jsonify(result), 201
+
+@uploads_bp.route('/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    user_id = int(get_jwt_identity())
+    upload = _get_session(upload_id, user_id)
+    
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    return jsonify(_session_json(upload)), 200
+
+@uploads_bp.route('/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    user_id = int(get_jwt_identity())
+    upload = _get_session(upload_id, user_id)
+    
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    if upload.status != 'uploading':
+        return jsonify({'error': 'Upload already finalized'}), 409
+    
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header required'}), 400
+    
+    # Client and server disagree (e.g. a chunk was lost); tell it where to resume
+    if offset != upload.received_bytes:
+        return jsonify({'error': 'Offset mismatch', 'offset': upload.received_bytes}), 409
+    
+    remaining = upload.total_size - offset
+    expected_checksum = request.headers.get('X-Chunk-SHA256')
+    chunk_hash = hashlib.sha256()
+    written = 0
+    
+    # Stream the raw body straight to disk; it is never buffered as a whole
+    with open(upload.temp_path, 'r+b') as f:
+        f.seek(offset)
+        while True:
+            block = request.stream.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if written > remaining:
+                f.truncate(offset)
+                return jsonify({'error': 'Chunk exceeds declared file size', 'offset': offset}), 400
+            chunk_hash.update(block)
+            f.write(block)
+        
+        if expected_checksum and chunk_hash.hexdigest() != expected_checksum.lower():
+            f.truncate(offset)
+            return jsonify({'error': 'Chunk checksum mismatch', 'offset': offset}), 400
+        
+        f.truncate(offset + written)
+    
+    upload.received_bytes = offset + written
+    upload.updated_at = datetime.utcnow()
+    db.session.commit()
+    
+    return jsonify(_session_json(upload)), 200
+
+@uploads_bp.route('/<upload_id>/finalize', methods=['POST'])
+@jwt_required()
+def finalize_upload(upload_id):
+    user_id = int(get_jwt_identity())
+    upload = _get_session(upload_id, user_id)
+    data = request.get_json(silent=True) or {}
+    
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    if upload.status != 'uploading':
+        return jsonify({'error': 'Upload already finalized'}), 409
+    
+    if upload.received_bytes != upload.total_size:
+        return jsonify({'error': 'Upload incomplete', 'offset': upload.received_bytes}), 409
+    
+    if upload.checksum:
+        file_hash = hashlib.sha256()
+        with open(upload.temp_path, 'rb') as f:
+            for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+                file_hash.update(block)
+        if file_hash.hexdigest() != upload.checksum.lower():
+            return jsonify({'error': 'File checksum mismatch'}), 400
+    
+    module = Module.query.filter_by(id=upload.module_id, deleted_at=None).first()
+    if not module:
+        return jsonify({'error': 'Module not found'}), 404
+    
+    if _has_curriculum(module):
+        # Lessons were generated while this file was uploading
+        os.remove(upload.temp_path)
+        upload.status = 'failed'
+        db.session.commit()
+        return jsonify({'error': 'Module already has lessons; create a new module for more files'}), 409
+    
+    if module.processing_status == 'processing':
+        # The session is kept, so finalizing can be retried if processing ends without lessons
+        return jsonify({'error': 'Module is being processed; finalize again once it has finished'}), 409
+    
+    upload_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], str(module.id))
+    
+    saved_paths = []
+    try:
+        for file_obj in save_assembled_upload(upload.temp_path, upload.filename, module.id, upload_folder):
+            db.session.add(file_obj)
+            saved_paths.append(file_obj.file_path)
+    except Exception as e:
+        # Nothing of a failed finalize is kept; the client has to start a new upload
+        db.session.rollback()
+        print(f"❌ Rejected resumable upload {upload.id}: {e}")
+        for path in saved_paths + [upload.temp_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        upload.status = 'failed'
+        db.session.commit()
+        if isinstance(e, (ZipLimitError, zipfile.BadZipFile)):
+            return jsonify({'error': f'Invalid archive: {str(e)}'}), 400
+        raise
+    
+    file_count = len(saved_paths)
+    upload.status = 'completed'
+    db.session.commit()
+    print(f"✓ Finalized upload {upload.id} into module {module.id} ({file_count} files)")
+    
+    if data.get('process', True) and file_count:
+        start_module_processing(module)
+    
+    return jsonify({
+        'upload_id': upload.id,
+        'module_id': module.id,
+        'file_count': file_count,
+        'processing_status': module.processing_status
+    }), 200
+
+@job_handler('expire_uploads', periodic=True)
+def expire_uploads_job(payload):
+    """Delete upload sessions idle for longer than UPLOAD_SESSION_TTL and their partial files"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    temp_paths = [upload.temp_path for upload in expired]
+    for upload in expired:
+        db.session.delete(upload)
+    db.session.commit()
+    
+    removed = 0
+    for path in temp_paths:
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    
+    # Partial files without a session (e.g. from a crash between creating the file and the row)
+    cutoff_time = time.time() - current_app.config['UPLOAD_SESSION_TTL']
+    for path in glob.glob(os.path.join(current_app.config['UPLOAD_FOLDER'], '*', '.partial', '*')):
+        if os.path.getmtime(path) < cutoff_time and UploadSession.query.get(os.path.basename(path)) is None:
+            os.remove(path)
+            removed += 1
+    
+    if expired or removed:
+        print(f"🧹 Expired {len(expired)} upload sessions, removed {removed} partial files")
@@ -0,0 +1,340 @@
+from models import Job, db
+from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import json
+import threading
+import traceback
+import uuid
+
+# job_type -> callable(payload); registered with @job_handler
+_handlers = {}
+# Job types every WorkerPool enqueues on start and then every maintenance_interval
+_periodic = set()
+# job_type -> callable(payload, error); registered with @job_failure_handler
+_failure_handlers = {}
+
+def job_handler(job_type, periodic=False):
+    """Register a function as the handler for a job type (periodic: run as maintenance)"""
+    def decorator(func):
+        _handlers[job_type] = func
+        if periodic:
+            _periodic.add(job_type)
+        return func
+    return decorator
+
+def job_failure_handler(job_type):
+    """Register a function to run once a job of this type has failed for good"""
+    def decorator(func):
+        _failure_handlers[job_type] = func
+        return func
+    return decorator
+
+class JobQueue:
+    """Durable job queue stored in the application database.
+    
+    Jobs are claimed atomically with a single UPDATE, so any number of worker
+    threads and processes can share one queue. A claimed job stays invisible
+    until its visibility timeout expires; workers extend it with heartbeats,
+    and a job whose worker died is picked up again afterwards.
+    """
+    
+    def __init__(self, visibility_timeout=600, backoff_base=30, backoff_max=3600):
+        self.visibility_timeout = visibility_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+    
+    def init_app(self, app):
+        """Read JOB_* settings from the Flask config"""
+        self.visibility_timeout = app.config.get('JOB_VISIBILITY_TIMEOUT', self.visibility_timeout)
+        self.backoff_base = app.config.get('JOB_BACKOFF_BASE', self.backoff_base)
+    
+    def enqueue(self, job_type, payload=None, max_attempts=3, dedupe_key=None, delay=0):
+        """Add a job; with dedupe_key, return the existing active job instead of a duplicate"""
+        existing = self._active(dedupe_key)
+        if existing:
+            return existing
+        
+        job = Job(
+            job_type=job_type,
+            payload=json.dumps(payload or {}),
+            dedupe_key=dedupe_key,
+            status='queued',
+            attempts=0,
+            max_attempts=max_attempts,
+            run_after=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another process queued the same key since the check above
+            # (ux_job_dedupe_key_active allows one active job per key)
+            db.session.rollback()
+            existing = self._active(dedupe_key)
+            if existing:
+                return existing
+            raise
+        print(f"📥 Queued job {job.id} ({job_type})")
+        return job
+    
+    def _active(self, dedupe_key):
+        if not dedupe_key:
+            return None
+        return Job.query.filter(
+            Job.dedupe_key == dedupe_key,
+            Job.status.in_(['queued', 'running'])
+        ).first()
+    
+    def claim(self):
+        """Atomically take the next runnable job, or return None"""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        claimable = or_(
+            and_(Job.status == 'queued', Job.run_after <= now),
+            and_(Job.status == 'running', Job.locked_until < now)
+        )
+        
+        next_id = db.session.query(Job.id).filter(claimable).order_by(Job.run_after, Job.id).limit(1).scalar_subquery()
+        claimed = Job.query.filter(Job.id == next_id, claimable).update({
+            'status': 'running',
+            'locked_by': token,
+            'locked_until': now + timedelta(seconds=self.visibility_timeout),
+            'started_at': now,
+            'attempts': Job.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        
+        if not claimed:
+            return None
+        
+        job = Job.query.filter_by(locked_by=token).first()
+        if job and job.attempts > job.max_attempts:
+            # Its worker kept dying mid-run; stop retrying
+            error = 'Exceeded max attempts (worker lost)'
+            if self._finish(job, 'failed', error):
+                self._gave_up(job, error)
+            return None
+        return job
+    
+    def heartbeat(self, job):
+        """Extend the visibility timeout of a job this worker still owns"""
+        Job.query.filter_by(id=job.id, locked_by=job.locked_by, status='running').update({
+            'locked_until': datetime.utcnow() + timedelta(seconds=self.visibility_timeout)
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    def complete(self, job):
+        """Mark a job done; returns False if this worker no longer owns it"""
+        return self._finish(job, 'succeeded') > 0
+    
+    def fail(self, job, error):
+        """Retry with exponential backoff, or mark failed after max_attempts"""
+        if job.attempts < job.max_attempts:
+            delay = min(self.backoff_base * 2 ** (job.attempts - 1), self.backoff_max)
+            Job.query.filter_by(id=job.id, locked_by=job.locked_by).update({
+                'status': 'queued',
+                'locked_by': None,
+                'locked_until': None,
+                'run_after': datetime.utcnow() + timedelta(seconds=delay),
+                'last_error': error
+            }, synchronize_session=False)
+            db.session.commit()
+            print(f"↻ Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay}s")
+        else:
+            if self._finish(job, 'failed', error):
+                self._gave_up(job, error)
+            print(f"❌ Job {job.id} failed permanently: {error}")
+    
+    def release(self, job):
+        """Hand a job back to the queue without counting the attempt (graceful shutdown)"""
+        Job.query.filter_by(id=job.id, locked_by=job.locked_by).update({
+            'status': 'queued',
+            'locked_by': None,
+            'locked_until': None,
+            'attempts': Job.attempts - 1
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    def _finish(self, job, status, error=None):
+        updated = Job.query.filter_by(id=job.id, locked_by=job.locked_by).update({
+            'status': status,
+            'locked_until': None,
+            'finished_at': datetime.utcnow(),
+            'last_error': error
+        }, synchronize_session=False)
+        db.session.commit()
+        return updated
+    
+    def _gave_up(self, job, error):
+        handler = _failure_handlers.get(job.job_type)
+        if handler is None:
+            return
+        try:
+            handler(json.loads(job.payload or '{}'), error)
+        except Exception as e:
+            print(f"Failure handler for job {job.id} ({job.job_type}) failed: {e}")
+            db.session.rollback()
+    
+    def metrics(self, window=100):
+        """Queue depth per status plus wait/run latency of recent finished jobs"""
+        depth = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+        
+        oldest_queued = db.session.query(func.min(Job.created_at)).filter(Job.status == 'queued').scalar()
+        now = datetime.utcnow()
+        
+        recent = Job.query.filter(
+            Job.status.in_(['succeeded', 'failed']),
+            Job.finished_at.isnot(None)
+        ).order_by(Job.finished_at.desc()).limit(window).all()
+        
+        waits = [(j.started_at - j.created_at).total_seconds() for j in recent if j.started_at]
+        runs = [(j.finished_at - j.started_at).total_seconds() for j in recent if j.started_at]
+        
+        return {
+            'depth': {status: depth.get(status, 0) for status in ('queued', 'running', 'succeeded', 'failed')},
+            'oldest_queued_seconds': (now - oldest_queued).total_seconds() if oldest_queued else 0,
+            'avg_wait_seconds': sum(waits) / len(waits) if waits else 0,
+            'avg_run_seconds': sum(runs) / len(runs) if runs else 0,
+            'max_run_seconds': max(runs) if runs else 0,
+            'sample_size': len(recent)
+        }
+
+job_queue = JobQueue()
+
+class WorkerPool:
+    """A fixed number of threads pulling jobs from the queue.
+    
+    A maintenance thread also enqueues the periodic job types every
+    maintenance_interval seconds; their dedupe keys keep pools in several
+    processes from piling up copies.
+    """
+    
+    def __init__(self, app, concurrency=2, poll_interval=1.0, queue=None, maintenance_interval=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.queue = queue or job_queue
+        self.maintenance_interval = maintenance_interval or app.config.get('JOB_MAINTENANCE_INTERVAL', 3600)
+        self._stop = threading.Event()
+        self._threads = []
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+    
+    def start(self):
+        for idx in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if _periodic:
+            thread = threading.Thread(target=self._maintain, name="job-maintenance", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✓ Started {self.concurrency} job workers")
+    
+    def stop(self, timeout=None):
+        """Stop claiming new jobs and wait for running ones to finish"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        return not any(thread.is_alive() for thread in self._threads)
+    
+    def release_in_flight(self):
+        """Return jobs that are still running to the queue so another worker can take them"""
+        with self._in_flight_lock:
+            jobs = list(self._in_flight.values())
+        
+        with self.app.app_context():
+            for job in jobs:
+                try:
+                    self.queue.release(job)
+                    print(f"↩️  Released job {job.id} ({job.job_type}) back to the queue")
+                except Exception as e:
+                    print(f"Failed to release job {job.id}: {e}")
+                    db.session.rollback()
+            db.session.remove()
+        return len(jobs)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    job = self.queue.claim()
+                except Exception as e:
+                    print(f"Job claim error: {e}")
+                    db.session.rollback()
+                    job = None
+                
+                if job is None:
+                    db.session.remove()
+                else:
+                    self._execute(job)
+                    db.session.remove()
+                    continue
+            
+            self._stop.wait(self.poll_interval)
+    
+    def _maintain(self):
+        while True:
+            with self.app.app_context():
+                for job_type in sorted(_periodic):
+                    try:
+                        self.queue.enqueue(job_type, dedupe_key=f"periodic:{job_type}")
+                    except Exception as e:
+                        print(f"Could not queue maintenance job {job_type}: {e}")
+                        db.session.rollback()
+                db.session.remove()
+            if self._stop.wait(self.maintenance_interval):
+                return
+    
+    def _execute(self, job):
+        # Detached copy of the claim: reloading the row after a release would
+        # otherwise hand us someone else's (or no) claim token
+        job = Job(
+            id=job.id,
+            job_type=job.job_type,
+            payload=job.payload,
+            attempts=job.attempts,
+            max_attempts=job.max_attempts,
+            locked_by=job.locked_by
+        )
+        handler = _handlers.get(job.job_type)
+        if handler is None:
+            self.queue.fail(job, f"No handler registered for job type '{job.job_type}'")
+            return
+        
+        print(f"▶️  Running job {job.id} ({job.job_type}, attempt {job.attempts})")
+        with self._in_flight_lock:
+            self._in_flight[job.id] = job
+        
+        beating = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, beating), daemon=True)
+        heartbeat.start()
+        
+        try:
+            handler(json.loads(job.payload or '{}'))
+            db.session.rollback()  # Discard anything the handler left uncommitted
+            if self.queue.complete(job):
+                print(f"✓ Job {job.id} ({job.job_type}) finished")
+            else:
+                print(f"⚠️ Job {job.id} finished after its claim was released or expired")
+        except Exception as e:
+            traceback.print_exc()
+            db.session.rollback()
+            self.queue.fail(job, f"{type(e).__name__}: {e}")
+        finally:
+            beating.set()
+            heartbeat.join()
+            with self._in_flight_lock:
+                self._in_flight.pop(job.id, None)
+    
+    def _heartbeat(self, job, done):
+        interval = max(self.queue.visibility_timeout / 3, 1)
+        while not done.wait(interval):
+            with self.app.app_context():
+                try:
+                    self.queue.heartbeat(job)
+                except Exception as e:
+                    print(f"Job heartbeat error: {e}")
+                finally:
+                    db.session.remove()
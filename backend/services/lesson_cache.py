@@ -0,0 +1,52 @@
+from collections import OrderedDict
+import threading
+
+class LessonPayloadCache:
+    """LRU cache of the serialized static part of lesson payloads.
+    
+    Entries hold the JSON text for a lesson's title, plan, objectives and
+    components, keyed by Lesson.content_version. The next lesson depends on
+    the rest of the module, so get_lesson adds it per request. Writers call
+    invalidate() after adding components or objectives. Content written by
+    another process (e.g. a worker) bumps the version, so stale entries are
+    never served.
+    """
+    
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # lesson_id -> (content_version, json_text)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, lesson_id, content_version):
+        with self._lock:
+            entry = self._entries.get(lesson_id)
+            if entry is None or entry[0] != content_version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(lesson_id)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, lesson_id, content_version, json_text):
+        with self._lock:
+            self._entries[lesson_id] = (content_version, json_text)
+            self._entries.move_to_end(lesson_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, lesson_id):
+        with self._lock:
+            self._entries.pop(lesson_id, None)
+    
+    def invalidate_many(self, lesson_ids):
+        with self._lock:
+            for lesson_id in lesson_ids:
+                self._entries.pop(lesson_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+lesson_cache = LessonPayloadCache()
@@ -0,0 +1,148 @@
+import sqlite3
+import re
+
+
+class LexicalService:
+    """Keyword index over file chunks backed by SQLite FTS5.
+    
+    Chunks are stored in a plain table (fast lookups by file) with an
+    external-content FTS5 table on top for BM25 ranking. It never touches the
+    embedding model, so lookups stay cheap even when Chroma is slow.
+    """
+    
+    def __init__(self, db_path="./lexical_index.db"):
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._create_schema()
+    
+    def _create_schema(self):
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunk (
+                id INTEGER PRIMARY KEY,
+                chunk_id TEXT UNIQUE NOT NULL,
+                file_id INTEGER NOT NULL,
+                chunk INTEGER NOT NULL,
+                filename TEXT,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunk_file_chunk ON chunk (file_id, chunk);
+            
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_fts USING fts5(
+                content,
+                content='chunk',
+                content_rowid='id',
+                tokenize='porter unicode61'
+            );
+            
+            CREATE TRIGGER IF NOT EXISTS chunk_ai AFTER INSERT ON chunk BEGIN
+                INSERT INTO chunk_fts(rowid, content) VALUES (new.id, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS chunk_ad AFTER DELETE ON chunk BEGIN
+                INSERT INTO chunk_fts(chunk_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END;
+        """)
+        self.conn.commit()
+    
+    def add_chunks(self, file_id, filename, chunks, start_index=0):
+        """Store chunks for a file (replacing any with the same chunk ids)"""
+        rows = [
+            (f"file_{file_id}_chunk_{start_index + idx}", file_id, start_index + idx, filename, chunk)
+            for idx, chunk in enumerate(chunks)
+        ]
+        with self.conn:
+            self.conn.executemany("DELETE FROM chunk WHERE chunk_id = ?", [(row[0],) for row in rows])
+            self.conn.executemany(
+                "INSERT INTO chunk (chunk_id, file_id, chunk, filename, content) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+    
+    def delete_file(self, file_id):
+        """Remove all chunks belonging to a file"""
+        with self.conn:
+            self.conn.execute("DELETE FROM chunk WHERE file_id = ?", (file_id,))
+    
+    def sweep_orphans(self, live_file_ids, confirm=None):
+        """Delete chunks whose file no longer exists. Returns chunks removed.
+        
+        confirm(file_ids), if given, returns the candidates that really are
+        orphans, for callers whose live_file_ids may be out of date.
+        """
+        live_file_ids = set(live_file_ids)
+        stored = [row[0] for row in self.conn.execute("SELECT DISTINCT file_id FROM chunk")]
+        orphans = [file_id for file_id in stored if file_id not in live_file_ids]
+        if confirm and orphans:
+            orphans = confirm(orphans)
+        
+        removed = 0
+        with self.conn:
+            for file_id in orphans:
+                removed += self.conn.execute("DELETE FROM chunk WHERE file_id = ?", (file_id,)).rowcount
+        return removed
+    
+    def optimize(self):
+        """Merge FTS segments and reclaim free pages"""
+        with self.conn:
+            self.conn.execute("INSERT INTO chunk_fts(chunk_fts) VALUES ('optimize')")
+        self.conn.execute("VACUUM")
+    
+    def has_file(self, file_id):
+        return self.conn.execute(
+            "SELECT 1 FROM chunk WHERE file_id = ? LIMIT 1", (file_id,)
+        ).fetchone() is not None
+    
+    def get_file_chunks(self, file_id):
+        """All chunks of a file in document order"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT content FROM chunk WHERE file_id = ? ORDER BY chunk", (file_id,)
+        )]
+    
+    def get_overview(self, file_ids, limit=5):
+        """Leading chunks of each file, interleaved so every file is represented"""
+        per_file = {}
+        for file_id in file_ids:
+            per_file[file_id] = [row[0] for row in self.conn.execute(
+                "SELECT content FROM chunk WHERE file_id = ? ORDER BY chunk LIMIT ?",
+                (file_id, limit)
+            )]
+        
+        overview = []
+        depth = 0
+        while len(overview) < limit and any(len(chunks) > depth for chunks in per_file.values()):
+            for file_id in file_ids:
+                chunks = per_file[file_id]
+                if depth < len(chunks) and len(overview) < limit:
+                    overview.append(chunks[depth])
+            depth += 1
+        
+        return overview
+    
+    def search(self, query, file_ids, limit=10):
+        """BM25-ranked chunks matching any term of the query.
+        
+        Returns a list of dicts with id, document and score (lower is better).
+        """
+        match = self._match_expression(query)
+        if not match or not file_ids:
+            return []
+        
+        placeholders = ",".join("?" for _ in file_ids)
+        rows = self.conn.execute(
+            f"""
+            SELECT chunk.chunk_id, chunk.content, bm25(chunk_fts) AS score
+            FROM chunk_fts
+            JOIN chunk ON chunk.id = chunk_fts.rowid
+            WHERE chunk_fts MATCH ? AND chunk.file_id IN ({placeholders})
+            ORDER BY score
+            LIMIT ?
+            """,
+            [match, *file_ids, limit]
+        ).fetchall()
+        
+        return [{'id': row[0], 'document': row[1], 'score': row[2]} for row in rows]
+    
+    def _match_expression(self, query, max_terms=32):
+        """Turn free text into an FTS5 OR-query of quoted terms"""
+        terms = []
+        for term in re.findall(r"\w+", query.lower()):
+            if term not in terms:
+                terms.append(term)
+        return " OR ".join(f'"{term}"' for term in terms[:max_terms])
@@ -4,6 +4,7 @@ import os
 import time
 import re
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from services.vector_service import VectorService
 from models import File, Lesson, LearningObjective
@@ -221,6 +222,96 @@ class LLMService:
             return [{'order': 0, 'type': 'info_card', 'data': {'title': 'Introduction', 'content': 'Welcome to the lesson'}}]
         return {}
     
+    def summarize_files(self, files, max_workers=4, group_chars=12000):
+        """Map-reduce summaries for a set of files.
+        
+        Each file's chunks are split into groups of about group_chars; every
+        group is summarised in parallel (map) and files with several groups get
+        one more call to merge them (reduce). Returns {file_id: summary}.
+        """
+        groups_by_file = {}
+        for file in files:
+            chunks = self.vector_service.lexical.get_file_chunks(file.id)
+            groups_by_file[file.id] = (file.filename, self._group_chunks(chunks, group_chars))
+        
+        jobs = [
+            (file_id, filename, group_idx, len(groups), group)
+            for file_id, (filename, groups) in groups_by_file.items()
+            for group_idx, group in enumerate(groups)
+        ]
+        
+        partials = {file_id: [None] * len(groups) for file_id, (_, groups) in groups_by_file.items()}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda job: (job[0], job[2], self._summarize_text(job[1], job[4], job[2], job[3])), jobs)
+            for file_id, group_idx, summary in results:
+                partials[file_id][group_idx] = summary
+        
+        summaries = {}
+        reduce_jobs = []
+        for file_id, parts in partials.items():
+            if not parts:
+                summaries[file_id] = ""
+            elif len(parts) == 1:
+                summaries[file_id] = parts[0]
+            else:
+                reduce_jobs.append((file_id, groups_by_file[file_id][0], "\n\n".join(parts)))
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(lambda job: (job[0], self._summarize_text(job[1], job[2])), reduce_jobs)
+            for file_id, summary in results:
+                summaries[file_id] = summary
+        
+        return summaries
+    
+    def _group_chunks(self, chunks, group_chars):
+        groups = []
+        current = ""
+        for chunk in chunks:
+            if current and len(current) + len(chunk) > group_chars:
+                groups.append(current)
+                current = ""
+            current += chunk + "\n"
+        if current:
+            groups.append(current)
+        return groups
+    
+    def _summarize_text(self, filename, text, part=0, total_parts=1):
+        """Summarise one file (or one part of it) into a compact study overview"""
+        part_note = f" (part {part + 1} of {total_parts})" if total_parts > 1 else ""
+        prompt = f"""
+Summarize this course material from "{filename}"{part_note} for a curriculum designer. Be CONCISE.
+
+Material:
+{text}
+
+Write at most 150 words: the main topics in order, key terms, formulae or named cases, and how advanced the material is.
+Return plain text only.
+"""
+        summary = self._call_llm(prompt, response_format='text')
+        if not isinstance(summary, str) or not summary.strip():
+            # Fallback returns structures rather than text; use the opening of the material instead
+            return text[:600].strip()
+        return summary.strip()
+    
+    def _summaries_context(self, file_ids, max_chars=20000):
+        """Stored per-file summaries as prompt context, or "" if none exist.
+        
+        Each file gets an equal share of max_chars (what a short summary leaves
+        unused goes to the longer ones), so later files are shortened rather
+        than cut off entirely.
+        """
+        files = File.query.filter(File.id.in_(file_ids)).order_by(File.id).all() if file_ids else []
+        sections = [f"[File {f.id}: {f.filename}]\n{f.summary}" for f in files if f.summary]
+        
+        remaining = max_chars - 2 * max(len(sections) - 1, 0)
+        trimmed = list(sections)
+        by_length = sorted(range(len(sections)), key=lambda i: len(sections[i]))
+        for position, i in enumerate(by_length):
+            share = max(remaining // (len(sections) - position), 0)
+            trimmed[i] = sections[i][:share]
+            remaining -= len(trimmed[i])
+        return "\n\n".join(section for section in trimmed if section)
+    
     def generate_curriculum(self, module_id, files):
         """Generate lessons structure directly from uploaded files"""
         # Get file information
@@ -234,9 +325,9 @@ class LLMService:
                 'type': file.file_type
             })
         
-        # Query vector database for context (skip if no files)
-        context = ""
-        if all_file_ids:
+        # Prefer the precomputed per-file summaries; fall back to raw chunks
+        context = self._summaries_context(all_file_ids)
+        if not context and all_file_ids:
             try:
                 context = self.vector_service.get_files_context(all_file_ids)
             except Exception as e:
@@ -289,7 +380,7 @@ Return ONLY a JSON array:
         if file_ids:
             try:
                 print(f"Getting context for file_ids: {file_ids}")
-                context = self.vector_service.get_files_context(file_ids)
+                context = self._summaries_context(file_ids) or self.vector_service.get_files_context(file_ids)
                 print(f"Context retrieved: {len(context)} chars")
             except Exception as e:
                 print(f"⚠️ Error getting file context: {e}")
@@ -336,7 +427,7 @@ Return ONLY a JSON array:
         
         # Get relevant content from vector DB
         file_ids = json.loads(lesson.file_ids) if lesson.file_ids else []
-        context = self.vector_service.query_relevant_content(objectives_text, file_ids)
+        context = self.vector_service.query_relevant_content(objectives_text, file_ids, module_id=lesson.module_id)
         
         prompt = f"""
 You are an adaptive learning system. Be CONCISE and focused.
@@ -600,14 +691,16 @@ If all objectives are covered, return null.
         """
         Evaluate if user has met the learning objectives for this lesson.
         Returns: (objectives_met: bool, evaluation_data: dict, should_continue: bool)
+        Reads stored telemetry only; callers flush telemetry_buffer first.
         """
         from models import LessonComponent, Telemetry
+        from sqlalchemy.orm import undefer
         
         lesson = Lesson.query.get(lesson_id)
         objectives = LearningObjective.query.filter_by(lesson_id=lesson_id).all()
         
         # Get ALL telemetry for this lesson to analyze learning (including adaptive phase)
-        all_telemetry = Telemetry.query.filter_by(
+        all_telemetry = Telemetry.query.options(undefer(Telemetry.event_data)).filter_by(
             user_id=user_id,
             lesson_id=lesson_id
         ).order_by(Telemetry.timestamp.desc()).limit(100).all()
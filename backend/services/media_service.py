@@ -0,0 +1,152 @@
+import abc
+import importlib.util
+import os
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pydub import AudioSegment
+from pydub.utils import which
+
+MEDIA_TYPES = {'mp3', 'mp4'}
+
+class Transcriber(abc.ABC):
+    """Speech-to-text backend used by MediaPipeline.
+    
+    transcribe() receives one mono 16 kHz pydub AudioSegment window and
+    returns its text. Implementations must be safe to call from several
+    worker threads at once.
+    """
+    
+    @abc.abstractmethod
+    def transcribe(self, segment):
+        pass
+
+class StubTranscriber(Transcriber):
+    """Deterministic backend for tests and machines without a model"""
+    
+    def transcribe(self, segment):
+        return f"[{len(segment) / 1000:.1f}s of audio]"
+
+class LocalTranscriber(Transcriber):
+    """CPU transcription with faster-whisper (optional dependency)"""
+    
+    def __init__(self, model_size='base', workers=2):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(model_size, device='cpu', compute_type='int8', num_workers=workers)
+    
+    def transcribe(self, segment):
+        import numpy as np
+        samples = np.array(segment.get_array_of_samples()).astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(samples, beam_size=1)
+        return " ".join(s.text.strip() for s in segments)
+
+class MediaPipeline:
+    """Decode audio in fixed windows and transcribe them in a worker pool.
+    
+    ffmpeg streams raw PCM, so only the windows currently queued or being
+    transcribed are held in memory, regardless of recording length.
+    """
+    
+    SAMPLE_RATE = 16000
+    SAMPLE_WIDTH = 2
+    
+    def __init__(self, transcriber, window_seconds=30, workers=2, max_pending=None):
+        self.transcriber = transcriber
+        self.window_seconds = window_seconds
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+    
+    def transcribe_file(self, file_path):
+        """Yield (start_seconds, text) per window, in order, as soon as each is ready"""
+        ffmpeg = which("ffmpeg") or which("avconv")
+        if not ffmpeg:
+            raise RuntimeError("ffmpeg is required to decode audio/video files")
+        
+        process = subprocess.Popen(
+            [ffmpeg, '-nostdin', '-loglevel', 'error', '-i', file_path,
+             '-vn', '-f', 's16le', '-ac', '1', '-ar', str(self.SAMPLE_RATE), 'pipe:1'],
+            stdout=subprocess.PIPE
+        )
+        try:
+            yield from self.transcribe_stream(process.stdout)
+        finally:
+            process.stdout.close()
+            process.kill()
+            process.wait()
+    
+    def transcribe_stream(self, stream):
+        """Transcribe raw 16-bit mono PCM from a file-like object"""
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for start_seconds, segment in self._read_windows(stream):
+                pending.append((start_seconds, executor.submit(self.transcriber.transcribe, segment)))
+                # Bound memory: wait for the oldest window before decoding more
+                if len(pending) >= self.max_pending:
+                    start, future = pending.popleft()
+                    yield start, future.result()
+            
+            while pending:
+                start, future = pending.popleft()
+                yield start, future.result()
+    
+    def _read_windows(self, stream):
+        window_bytes = self.window_seconds * self.SAMPLE_RATE * self.SAMPLE_WIDTH
+        index = 0
+        while True:
+            data = stream.read(window_bytes)
+            if not data:
+                break
+            # A trailing odd byte cannot form a sample
+            data = data[:len(data) - len(data) % self.SAMPLE_WIDTH]
+            if data:
+                segment = AudioSegment(
+                    data=data,
+                    sample_width=self.SAMPLE_WIDTH,
+                    frame_rate=self.SAMPLE_RATE,
+                    channels=1
+                )
+                yield index * self.window_seconds, segment
+            index += 1
+
+_pipeline = None
+_pipeline_loaded = False
+_pipeline_lock = threading.Lock()
+
+def get_media_pipeline():
+    """Shared pipeline configured from the environment, or None if unavailable.
+    
+    TRANSCRIBER_BACKEND selects 'local' (faster-whisper), 'stub' or 'auto'
+    (default: local when faster-whisper is installed, otherwise media files
+    are indexed by name only, as before transcription existed).
+    """
+    global _pipeline, _pipeline_loaded
+    with _pipeline_lock:
+        if _pipeline_loaded:
+            return _pipeline
+        
+        backend = os.getenv('TRANSCRIBER_BACKEND', 'auto')
+        workers = int(os.getenv('TRANSCRIBE_WORKERS', '2'))
+        window_seconds = int(os.getenv('MEDIA_WINDOW_SECONDS', '30'))
+        
+        if backend == 'auto':
+            if importlib.util.find_spec('faster_whisper') is None:
+                print("⚠️ Media transcription disabled: faster-whisper is not installed "
+                      "(see the optional section of requirements.txt)")
+                _pipeline_loaded = True
+                return None
+            backend = 'local'
+        
+        try:
+            if backend == 'stub':
+                transcriber = StubTranscriber()
+            else:
+                transcriber = LocalTranscriber(os.getenv('WHISPER_MODEL', 'base'), workers=workers)
+            _pipeline = MediaPipeline(transcriber, window_seconds=window_seconds, workers=workers)
+            print(f"✓ Media transcription enabled ({backend} backend, {workers} workers)")
+        except Exception as e:
+            print(f"⚠️ Media transcription unavailable: {e}")
+            _pipeline = None
+        
+        _pipeline_loaded = True
+        return _pipeline
@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from models import db
+
+class ProgressStore:
+    """Live processing progress shared between the web and worker processes.
+    
+    Each module's progress is one small JSON file replaced atomically, so a
+    worker in another process can publish updates without touching SQLite.
+    Reads are served from memory and only re-read a file when its mtime
+    changes.
+    
+    A completed or failed state is kept for terminal_ttl seconds, long enough
+    for every event stream to send it, and then removed; the Module row holds
+    the final state from then on.
+    """
+    
+    TERMINAL_STATUSES = ('completed', 'error')
+    
+    def __init__(self, folder="./progress", terminal_ttl=60):
+        self.folder = folder
+        self.terminal_ttl = terminal_ttl
+        self._cache = {}  # module_id -> (mtime_ns, state)
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+    
+    def _path(self, module_id):
+        return os.path.join(self.folder, f"{module_id}.json")
+    
+    def set(self, module_id, status, step, progress, stage=None):
+        state = {
+            'processing_status': status,
+            'processing_step': step,
+            'processing_progress': int(progress),
+            'processing_stage': stage,
+            'updated_at': time.time()
+        }
+        fd, temp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self._path(module_id))
+        
+        with self._lock:
+            self._cache[module_id] = (os.stat(self._path(module_id)).st_mtime_ns, state)
+        return state
+    
+    def get(self, module_id):
+        """Latest published state, or None if the module has none"""
+        path = self._path(module_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            with self._lock:
+                self._cache.pop(module_id, None)
+            return None
+        
+        with self._lock:
+            cached = self._cache.get(module_id)
+        if cached and cached[0] == mtime:
+            if self._expired(cached[1]):
+                self.clear(module_id)
+                return None
+            return cached[1]
+        
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return cached[1] if cached else None
+        
+        with self._lock:
+            self._cache[module_id] = (mtime, state)
+        
+        if self._expired(state):
+            self.clear(module_id)
+            return None
+        return state
+    
+    def sweep(self):
+        """Remove terminal states past their TTL, including modules nobody reads anymore"""
+        removed = 0
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.folder, name)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if self._expired(state):
+                self.clear(name[:-len('.json')])
+                removed += 1
+        return removed
+    
+    def _expired(self, state):
+        return (state.get('processing_status') in self.TERMINAL_STATUSES
+                and time.time() - state.get('updated_at', 0) > self.terminal_ttl)
+    
+    def clear(self, module_id):
+        with self._lock:
+            self._cache.pop(module_id, None)
+        try:
+            os.remove(self._path(module_id))
+        except FileNotFoundError:
+            pass
+
+progress_store = ProgressStore(
+    os.getenv('PROGRESS_FOLDER', './progress'),
+    terminal_ttl=int(os.getenv('PROGRESS_TERMINAL_TTL', 60))
+)
+
+class ProgressReporter:
+    """Publish every progress change to the store, but write the Module row rarely.
+    
+    The row is only updated when the status changes (start, finish, error)
+    or when flush_interval seconds have passed since the last write, so it
+    stays a reasonable fallback without a commit per step.
+    """
+    
+    def __init__(self, module, store=None, flush_interval=5.0):
+        self.module = module
+        self.store = store or progress_store
+        self.flush_interval = flush_interval
+        self.stage = module.processing_stage
+        self.step = module.processing_step
+        self.progress = module.processing_progress or 0
+        self._last_flush = 0
+    
+    def start(self, step):
+        """Status transition into processing (first run or a retry)"""
+        self.step = step
+        self.store.set(self.module.id, 'processing', step, self.progress, self.stage)
+        self.flush('processing')
+    
+    def update(self, step, progress, stage=None):
+        if stage:
+            self.stage = stage
+        self.step = step
+        self.progress = int(progress)
+        self.store.set(self.module.id, 'processing', self.step, self.progress, self.stage)
+        
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self, status=None):
+        """Copy the current state onto the Module row and commit"""
+        if status:
+            self.module.processing_status = status
+        self.module.processing_stage = self.stage
+        self.module.processing_step = self.step
+        self.module.processing_progress = self.progress
+        db.session.commit()
+        self._last_flush = time.monotonic()
+    
+    def finish(self, step, status='completed', stage='done', progress=100):
+        self.stage = stage
+        self.step = step
+        self.progress = progress
+        self.store.set(self.module.id, status, step, progress, stage)
+        self.flush(status)
+        # The row now has the final state; finished modules' files expire after the TTL
+        self.store.sweep()
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+import threading
+
+class RetrievalCache:
+    """LRU cache of retrieved context shared by every VectorService in the process.
+    
+    Keys include the module's index_version, which is bumped whenever files are
+    embedded, so entries for a changed module simply stop being hit.
+    """
+    
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def make_key(self, module_id, index_version, file_ids, queries, *params):
+        """Build a key that ignores query order, case and spacing"""
+        normalized = sorted({" ".join(q.lower().split()) for q in queries if q and q.strip()})
+        return (module_id, index_version or 0, tuple(sorted(set(file_ids))), tuple(normalized), params)
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate_module(self, module_id):
+        """Drop every entry for a module"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == module_id]:
+                del self._entries[key]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+retrieval_cache = RetrievalCache()
@@ -0,0 +1,80 @@
+from models import TelemetryAggregate, db
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+import json
+import math
+
+# Event types analyze_telemetry reads; everything else leaves the aggregates alone
+AGGREGATED_EVENTS = ('time_spent', 'quiz_answer')
+
+# time_seconds comes from the client; one event never counts for more than this
+MAX_EVENT_SECONDS = 4 * 3600
+
+def aggregate_deltas(rows, deltas=None):
+    """Sum telemetry rows (mappings of Telemetry columns) into {(user_id, component_type): counters}"""
+    deltas = {} if deltas is None else deltas
+    for row in rows:
+        if row['event_type'] not in AGGREGATED_EVENTS:
+            continue
+        try:
+            data = json.loads(row['event_data']) if row['event_data'] else {}
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        component_type = str(data.get('component_type') or '')[:100]
+        
+        if row['event_type'] == 'time_spent':
+            if not component_type:
+                continue
+            try:
+                seconds = float(data.get('time_seconds') or 0)
+            except (TypeError, ValueError, OverflowError):
+                seconds = 0.0
+            # NaN, infinities and negative values count as nothing; huge ones are capped
+            seconds = min(max(seconds, 0.0), MAX_EVENT_SECONDS) if math.isfinite(seconds) else 0.0
+            counters = deltas.setdefault((row['user_id'], component_type), [0, 0.0, 0, 0])
+            counters[0] += 1
+            counters[1] += seconds
+        else:
+            counters = deltas.setdefault((row['user_id'], component_type), [0, 0.0, 0, 0])
+            counters[2] += 1
+            counters[3] += 1 if data.get('correct') else 0
+    return deltas
+
+def apply_aggregate_deltas(executor, deltas):
+    """Add deltas to the aggregate rows with one upsert; executor is a Connection or the session"""
+    if not deltas:
+        return
+    table = TelemetryAggregate.__table__
+    dialect = postgresql if db.engine.dialect.name == 'postgresql' else sqlite
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'component_type'],
+        set_={
+            'interactions': table.c.interactions + stmt.excluded.interactions,
+            'time_seconds': table.c.time_seconds + stmt.excluded.time_seconds,
+            'quiz_attempts': table.c.quiz_attempts + stmt.excluded.quiz_attempts,
+            'quiz_correct': table.c.quiz_correct + stmt.excluded.quiz_correct,
+            'updated_at': stmt.excluded.updated_at
+        }
+    )
+    now = datetime.utcnow()
+    executor.execute(stmt, [{
+        'user_id': user_id,
+        'component_type': component_type,
+        'interactions': interactions,
+        'time_seconds': time_seconds,
+        'quiz_attempts': quiz_attempts,
+        'quiz_correct': quiz_correct,
+        'updated_at': now
+    } for (user_id, component_type), (interactions, time_seconds, quiz_attempts, quiz_correct) in deltas.items()])
+
+def record_aggregates(executor, rows):
+    """Update the aggregates for telemetry rows inserted in the same transaction"""
+    apply_aggregate_deltas(executor, aggregate_deltas(rows))
+
+def remove_aggregates(executor, rows):
+    """Take telemetry rows deleted in the same transaction back out of the aggregates"""
+    deltas = aggregate_deltas(rows)
+    apply_aggregate_deltas(executor, {key: [-value for value in counters] for key, counters in deltas.items()})
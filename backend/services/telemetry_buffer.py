@@ -0,0 +1,284 @@
+from models import Lesson, LessonComponent, Telemetry, User, db
+from services.telemetry_aggregates import record_aggregates
+from sqlalchemy.exc import OperationalError
+from datetime import datetime
+import atexit
+import glob
+import json
+import os
+import threading
+import uuid
+
+TELEMETRY_COLUMNS = ('user_id', 'lesson_id', 'component_id', 'event_type', 'event_data', 'timestamp')
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+def _try_lock(file):
+    """Non-blocking exclusive lock on an open file; False if another process holds it"""
+    try:
+        if fcntl:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+class TelemetryBuffer:
+    """Write-behind buffer for telemetry events.
+    
+    Events are kept in memory and inserted with one executemany by a
+    background thread once flush_size are waiting or every flush_interval
+    seconds, so tracking an event costs no commit on the request path.
+    Each event is also appended to a spill file owned by this process; a
+    process that dies before flushing leaves its files behind and the next
+    start replays them. Spill writes are not fsynced, so a power failure
+    loses at most one interval of events.
+    
+    With flush_interval <= 0 (or before init_app) events are inserted
+    immediately.
+    """
+    
+    def __init__(self, folder="./telemetry_spool", flush_interval=2.0, flush_size=200, max_size=5000):
+        self.folder = folder
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_size = max_size
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.app = None
+        self._rows = []
+        self._segments = []  # Spill files holding self._rows, oldest first
+        self._spill = None
+        self._seq = 0
+        self._owner_lock = None
+        self._thread = None
+        self._lock = threading.Lock()  # Guards _rows, _segments and the spill file
+        self._flush_lock = threading.Lock()  # One insert at a time
+        self._wake = threading.Event()
+    
+    def init_app(self, app):
+        """Read TELEMETRY_* settings, replay leftover spill files and start the flush thread"""
+        if self.app is not None and self._rows:
+            with self.app.app_context():
+                self.flush()
+        self.app = app
+        
+        if self._thread is not None:
+            return
+        self.folder = os.path.abspath(app.config.get('TELEMETRY_SPILL_FOLDER', self.folder))
+        self.flush_interval = app.config.get('TELEMETRY_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_size = app.config.get('TELEMETRY_FLUSH_SIZE', self.flush_size)
+        self.max_size = app.config.get('TELEMETRY_BUFFER_MAX', self.max_size)
+        if self.flush_interval <= 0:
+            return
+        
+        os.makedirs(self.folder, exist_ok=True)
+        # Held for the life of the process: replay() skips files whose owner still holds it
+        self._owner_lock = open(self._lock_path(self.owner), 'a+')
+        _try_lock(self._owner_lock)
+        
+        with app.app_context():
+            self.replay()
+        
+        with self._lock:
+            self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def add(self, user_id, lesson_id, event_type, event_data=None, component_id=None, timestamp=None):
+        """Queue one event; event_data is the JSON string stored in Telemetry.event_data"""
+        row = {
+            'user_id': user_id,
+            'lesson_id': lesson_id,
+            'component_id': component_id,
+            'event_type': event_type,
+            'event_data': event_data,
+            'timestamp': timestamp or datetime.utcnow()
+        }
+        if self._spill is None:
+            self._insert([row])
+            return
+        
+        # Back-pressure: with the buffer full the caller waits for the insert
+        if len(self._rows) >= self.max_size:
+            self.flush()
+        
+        with self._lock:
+            self._spill.write(json.dumps({**row, 'timestamp': row['timestamp'].isoformat()}) + '\n')
+            self._spill.flush()
+            self._rows.append(row)
+            waiting = len(self._rows)
+        
+        if waiting >= self.flush_size:
+            self._wake.set()
+    
+    def flush(self):
+        """Insert everything buffered so far; call before reads that must see recent events"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._rows:
+                    return 0
+                rows, segments = self._rows, self._segments
+                self._rows, self._segments = [], []
+                self._open_segment()
+            
+            try:
+                self._insert(rows)
+            except Exception:
+                with self._lock:
+                    self._rows = rows + self._rows
+                    self._segments = segments + self._segments
+                raise
+            
+            for path in segments:
+                os.remove(path)
+            return len(rows)
+    
+    def replay(self):
+        """Insert events spilled by processes that exited without flushing them"""
+        replayed = 0
+        for lock_path in glob.glob(os.path.join(self.folder, 'telemetry-*.lock')):
+            owner = os.path.basename(lock_path)[len('telemetry-'):-len('.lock')]
+            if owner == self.owner:
+                continue
+            
+            with open(lock_path, 'a+') as lock_file:
+                if not _try_lock(lock_file):
+                    continue  # Owner is still running
+                
+                for path in sorted(glob.glob(os.path.join(self.folder, f"telemetry-{owner}-*.jsonl"))):
+                    rows = []
+                    with open(path, encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                row = json.loads(line)
+                                row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+                            except (ValueError, TypeError, KeyError):
+                                continue  # Torn last line from the crash, or an unreadable row
+                            rows.append(row)
+                    try:
+                        if rows:
+                            self._insert(rows)
+                    except Exception as e:
+                        # Set the segment aside rather than fail startup; it can be inspected and replayed by hand
+                        os.replace(path, path + '.bad')
+                        print(f"⚠️ Could not replay {os.path.basename(path)}, quarantined: {e}")
+                        continue
+                    os.remove(path)
+                    replayed += len(rows)
+            os.remove(lock_path)
+        
+        if replayed:
+            print(f"✓ Replayed {replayed} spilled telemetry events")
+        return replayed
+    
+    def close(self):
+        """Flush and remove this process's spill files (runs at interpreter exit)"""
+        if self._spill is None:
+            return
+        try:
+            with self.app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"Telemetry flush at exit failed, events kept for replay: {e}")
+            return
+        
+        with self._lock:
+            self._spill.close()
+            self._spill = None
+            for path in self._segments:
+                os.remove(path)
+            self._segments = []
+        self._owner_lock.close()
+        os.remove(self._lock_path(self.owner))
+    
+    def __len__(self):
+        return len(self._rows)
+    
+    def _lock_path(self, owner):
+        return os.path.join(self.folder, f"telemetry-{owner}.lock")
+    
+    def _open_segment(self):
+        # Caller holds self._lock
+        if self._spill is not None:
+            self._spill.close()
+        self._seq += 1
+        path = os.path.join(self.folder, f"telemetry-{self.owner}-{self._seq:06d}.jsonl")
+        self._spill = open(path, 'a', encoding='utf-8')
+        self._segments.append(path)
+    
+    def _insert(self, rows):
+        try:
+            self._insert_batch(rows)
+        except OperationalError:
+            raise  # Locked or unavailable database: keep everything for the next flush
+        except Exception as e:
+            # A bad row (its lesson was deleted meanwhile, or a value the driver
+            # cannot bind) must not hold back the rest. Set such rows aside and
+            # insert the others in one transaction, so a failure part way
+            # through never leaves some of them committed and the rest re-queued.
+            storable = self._storable(rows)
+            try:
+                if storable:
+                    self._insert_batch(storable)
+            except OperationalError:
+                raise
+            except Exception as retry_error:
+                print(f"⚠️ Dropped {len(rows)} telemetry events that could not be stored: {retry_error}")
+                return
+            if len(storable) < len(rows):
+                print(f"⚠️ Dropped {len(rows) - len(storable)} telemetry events that could not be stored: {e}")
+    
+    def _insert_batch(self, rows):
+        with db.engine.begin() as conn:
+            conn.execute(Telemetry.__table__.insert(), rows)
+            record_aggregates(conn, rows)
+    
+    def _storable(self, rows):
+        """Rows with well-typed values whose user, lesson and component still exist"""
+        typed = [
+            {column: row.get(column) for column in TELEMETRY_COLUMNS}
+            for row in rows
+            if type(row.get('user_id')) is int
+            and type(row.get('lesson_id')) is int
+            and (row.get('component_id') is None or type(row.get('component_id')) is int)
+            and isinstance(row.get('event_type'), str)
+            and (row.get('event_data') is None or isinstance(row.get('event_data'), str))
+            and isinstance(row.get('timestamp'), datetime)
+        ]
+        if not typed:
+            return []
+        
+        with db.engine.connect() as conn:
+            users = {r[0] for r in conn.execute(
+                db.select(User.id).where(User.id.in_({row['user_id'] for row in typed})))}
+            lessons = {r[0] for r in conn.execute(
+                db.select(Lesson.id).where(Lesson.id.in_({row['lesson_id'] for row in typed})))}
+            component_ids = {row['component_id'] for row in typed if row['component_id'] is not None}
+            components = {r[0] for r in conn.execute(
+                db.select(LessonComponent.id).where(LessonComponent.id.in_(component_ids)))} if component_ids else set()
+        
+        return [
+            row for row in typed
+            if row['user_id'] in users
+            and row['lesson_id'] in lessons
+            and (row['component_id'] is None or row['component_id'] in components)
+        ]
+    
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"Telemetry flush failed, retrying: {e}")
+
+telemetry_buffer = TelemetryBuffer()
@@ -1,31 +1,28 @@
-from models import Telemetry, Insight, db
+from models import Telemetry, TelemetryAggregate, Insight, db
+from services.telemetry_buffer import telemetry_buffer
+from sqlalchemy.orm import undefer
 import json
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 class TelemetryService:
     
     def track_event(self, user_id, lesson_id, event_type, event_data):
-        """Track a telemetry event"""
+        """Track a telemetry event (written in the background by telemetry_buffer)"""
         try:
-            telemetry = Telemetry(
+            telemetry_buffer.add(
                 user_id=user_id,
                 lesson_id=lesson_id,
                 event_type=event_type,
-                event_data=json.dumps(event_data) if event_data else None,
-                timestamp=datetime.now()
+                event_data=json.dumps(event_data) if event_data else None
             )
-            db.session.add(telemetry)
-            db.session.commit()
             return True
         except Exception as e:
             print(f"Error tracking telemetry event: {e}")
-            db.session.rollback()
             return False
     
     def get_recent_telemetry(self, user_id, lesson_id, limit=50):
         """Get recent telemetry events for a user in a lesson"""
-        telemetry = Telemetry.query.filter_by(
+        telemetry = Telemetry.query.options(undefer(Telemetry.event_data)).filter_by(
             user_id=user_id,
             lesson_id=lesson_id
         ).order_by(Telemetry.timestamp.desc()).limit(limit).all()
@@ -49,21 +46,21 @@ class TelemetryService:
             'confidence': i.confidence_score
         } for i in insights]
     
-    def analyze_telemetry(self, user_id, lesson_id, recent_telemetry):
-        """Analyze telemetry and generate insights"""
+    def analyze_telemetry(self, user_id, lesson_id, recent_telemetry, commit=True):
+        """Analyze telemetry and generate insights (with commit=False the caller commits them)"""
         if not recent_telemetry:
             return []
         
-        # Get all user telemetry for pattern analysis
-        all_telemetry = Telemetry.query.filter_by(user_id=user_id).all()
+        # The user's whole history as running totals (one row per component type)
+        aggregates = TelemetryAggregate.query.filter_by(user_id=user_id).all()
         
         insights = []
         
         # Analyze quiz performance
-        quiz_events = [t for t in all_telemetry if t.event_type == 'quiz_answer']
-        if len(quiz_events) >= 5:
-            correct_count = sum(1 for t in quiz_events if json.loads(t.event_data).get('correct', False))
-            accuracy = correct_count / len(quiz_events)
+        quiz_attempts = sum(a.quiz_attempts for a in aggregates)
+        if quiz_attempts >= 5:
+            correct_count = sum(a.quiz_correct for a in aggregates)
+            accuracy = correct_count / quiz_attempts
             
             if accuracy < 0.5:
                 insight = Insight(
@@ -75,17 +72,8 @@ class TelemetryService:
                 insights.append(insight)
         
         # Analyze component preferences
-        component_interactions = defaultdict(int)
-        component_time = defaultdict(float)
-        
-        for t in all_telemetry:
-            if t.event_type == 'time_spent':
-                data = json.loads(t.event_data) if t.event_data else {}
-                comp_type = data.get('component_type')
-                time_spent = data.get('time_seconds', 0)
-                if comp_type:
-                    component_interactions[comp_type] += 1
-                    component_time[comp_type] += time_spent
+        component_interactions = {a.component_type: a.interactions for a in aggregates if a.interactions}
+        component_time = {a.component_type: a.time_seconds for a in aggregates if a.interactions}
         
         # Find preferred component types
         if component_interactions:
@@ -129,7 +117,8 @@ class TelemetryService:
         for insight in insights:
             db.session.add(insight)
         
-        db.session.commit()
+        if commit:
+            db.session.commit()
         
         return [{
             'text': i.insight_text,
@@ -1,12 +1,16 @@
 import chromadb
 from chromadb.config import Settings
 import os
+import numpy as np
 try:
     from PyPDF2 import PdfReader
 except ImportError:
     from pypdf import PdfReader
 from docx import Document
 from pptx import Presentation
+from services.lexical_service import LexicalService
+from services.retrieval_cache import retrieval_cache
+from services.media_service import MEDIA_TYPES, get_media_pipeline
 
 class VectorService:
     def __init__(self):
@@ -19,6 +23,7 @@ class VectorService:
             )
         )
         self.collection = self.client.get_or_create_collection("files")
+        self.lexical = LexicalService()
     
     def extract_text(self, file_path, file_type):
         """Extract text from various file types"""
@@ -57,24 +62,244 @@ class VectorService:
     
     def add_file(self, file_path, file_id):
         """Add file to vector database"""
+        self.extract_file(file_path, file_id)
+        return self.embed_file(file_id)
+    
+    def extract_file(self, file_path, file_id):
+        """Extract and chunk a file into the keyword index (no embedding).
+        
+        Safe to re-run: any chunks from an earlier, interrupted attempt are
+        replaced. Returns the number of chunks stored.
+        """
         from models import File
         file = File.query.get(file_id)
         
+        self.lexical.delete_file(file_id)
+        media_pipeline = get_media_pipeline() if file.file_type in MEDIA_TYPES else None
+        
+        if media_pipeline:
+            return self._extract_media_file(file, file_path, media_pipeline)
+        
         text = self.extract_text(file_path, file.file_type)
+        if not text.strip():
+            return 0
+        
+        # Split into chunks (simple chunking - can be improved)
+        chunks = self._chunk_text(text)
+        self.lexical.add_chunks(file_id, file.filename, chunks)
+        return len(chunks)
+    
+    def embed_file(self, file_id, batch_size=64):
+        """Embed a file's extracted chunks into ChromaDB.
+        
+        Uses upsert so a retry after a crash simply overwrites chunks that
+        were already embedded.
+        """
+        from models import File
+        file = File.query.get(file_id)
+        chunks = self.lexical.get_file_chunks(file_id)
+        
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            self.collection.upsert(
+                documents=batch,
+                metadatas=[
+                    {"file_id": file_id, "chunk": start + idx, "filename": file.filename}
+                    for idx in range(len(batch))
+                ],
+                ids=[f"file_{file_id}_chunk_{start + idx}" for idx in range(len(batch))]
+            )
         
-        if text.strip():
-            # Split into chunks (simple chunking - can be improved)
-            chunks = self._chunk_text(text)
+        # New content invalidates cached retrievals for the module (committed by the caller)
+        file.module.index_version = (file.module.index_version or 0) + 1
+        retrieval_cache.invalidate_module(file.module_id)
+        
+        return f"file_{file_id}"
+    
+    def _extract_media_file(self, file, file_path, media_pipeline, chunk_size=1000, overlap=200):
+        """Transcribe a recording window by window, chunking each transcript as it arrives"""
+        pending = ""
+        next_index = 0
+        
+        try:
+            for start_seconds, transcript in media_pipeline.transcribe_file(file_path):
+                if not transcript.strip():
+                    continue
+                minutes, seconds = divmod(int(start_seconds), 60)
+                pending += f"[{minutes:02d}:{seconds:02d}] {transcript.strip()}\n"
+                
+                # Emit every full chunk now; keep the overlap for the next one
+                chunks = []
+                while len(pending) >= chunk_size:
+                    chunks.append(pending[:chunk_size])
+                    pending = pending[chunk_size - overlap:]
+                if chunks:
+                    self.lexical.add_chunks(file.id, file.filename, chunks, start_index=next_index)
+                    next_index += len(chunks)
             
-            # Add to ChromaDB
-            for idx, chunk in enumerate(chunks):
-                self.collection.add(
-                    documents=[chunk],
-                    metadatas=[{"file_id": file_id, "chunk": idx, "filename": file.filename}],
-                    ids=[f"file_{file_id}_chunk_{idx}"]
+            if pending.strip() and (next_index == 0 or len(pending) > overlap):
+                self.lexical.add_chunks(file.id, file.filename, [pending], start_index=next_index)
+                next_index += 1
+        except Exception as e:
+            print(f"Error transcribing {file_path}: {e}")
+            if next_index == 0:
+                self.lexical.add_chunks(file.id, file.filename, [f"Media file: {os.path.basename(file_path)}"])
+                next_index = 1
+        
+        return next_index
+    
+    def delete_file(self, file_id):
+        """Remove all chunks belonging to a file from the vector database"""
+        from models import File
+        self.collection.delete(where={"file_id": file_id})
+        self.lexical.delete_file(file_id)
+        
+        # Removed content invalidates cached retrievals too (committed by the caller);
+        # when the file row is already gone its module's entries were dropped with it
+        file = File.query.get(file_id)
+        if file is not None:
+            file.module.index_version = (file.module.index_version or 0) + 1
+            retrieval_cache.invalidate_module(file.module_id)
+    
+    def delete_files(self, file_ids):
+        """Remove chunks for several files, continuing past individual failures"""
+        deleted = 0
+        for file_id in file_ids:
+            try:
+                self.delete_file(file_id)
+                deleted += 1
+            except Exception as e:
+                print(f"Warning: Could not delete vector data for file {file_id}: {e}")
+        return deleted
+    
+    def sweep_orphans(self, live_file_ids, batch_size=1000):
+        """Delete chunks whose file_id no longer exists in the File table.
+        
+        live_file_ids is a snapshot taken before the sweep; files added
+        since may have been embedded meanwhile, so candidates are checked
+        against the File table again right before they are deleted.
+        Returns the number of chunks removed.
+        """
+        live_file_ids = set(live_file_ids)
+        candidates = {}  # file_id -> chunk ids
+        offset = 0
+        
+        while True:
+            results = self.collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            ids = results.get('ids') or []
+            if not ids:
+                break
+            
+            for chunk_id, metadata in zip(ids, results['metadatas']):
+                file_id = metadata.get('file_id') if metadata else None
+                if file_id not in live_file_ids:
+                    candidates.setdefault(file_id, []).append(chunk_id)
+            
+            offset += len(ids)
+        
+        orphan_ids = []
+        for file_id in self._missing_files(candidates):
+            orphan_ids.extend(candidates[file_id])
+        
+        for start in range(0, len(orphan_ids), batch_size):
+            self.collection.delete(ids=orphan_ids[start:start + batch_size])
+        
+        self.lexical.sweep_orphans(live_file_ids, confirm=self._missing_files)
+        
+        return len(orphan_ids)
+    
+    def _missing_files(self, file_ids, batch_size=500):
+        """The given file ids that have no File row right now (None counts as missing)"""
+        from models import File, db
+        file_ids = list(file_ids)
+        existing = set()
+        for start in range(0, len(file_ids), batch_size):
+            batch = [file_id for file_id in file_ids[start:start + batch_size] if file_id is not None]
+            if batch:
+                existing.update(row[0] for row in db.session.query(File.id).filter(File.id.in_(batch)))
+        return [file_id for file_id in file_ids if file_id not in existing]
+    
+    def compact(self, batch_size=1000):
+        """Rebuild the collection from its live chunks so the HNSW index
+        no longer carries tombstones left behind by deletes.
+        
+        Stored embeddings are copied across, so nothing is re-embedded.
+        The original stays intact until the rebuilt copy has taken its name.
+        Returns the number of chunks in the rebuilt collection.
+        """
+        staging_name = "files_compacting"
+        retired_name = "files_precompact"
+        if retired_name in [c.name for c in self.client.list_collections()]:
+            raise RuntimeError(
+                f"Collection '{retired_name}' is left over from an interrupted compaction; "
+                "check it against 'files' and delete it before compacting again"
+            )
+        
+        try:
+            self.client.delete_collection(staging_name)
+        except Exception:
+            pass
+        staging = self.client.create_collection(staging_name)
+        
+        copied = 0
+        offset = 0
+        while True:
+            results = self.collection.get(
+                include=["documents", "metadatas", "embeddings"],
+                limit=batch_size,
+                offset=offset
+            )
+            ids = results.get('ids') or []
+            if not ids:
+                break
+            
+            staging.add(
+                ids=ids,
+                documents=results['documents'],
+                metadatas=results['metadatas'],
+                embeddings=results['embeddings']
+            )
+            copied += len(ids)
+            offset += len(ids)
+        
+        # Swap by renaming, and only drop the original once the copy is live
+        self.collection.modify(name=retired_name)
+        try:
+            staging.modify(name="files")
+        except Exception:
+            self.collection.modify(name="files")
+            raise
+        self.client.delete_collection(retired_name)
+        self.collection = self.client.get_collection("files")
+        self.lexical.optimize()
+        
+        return copied
+    
+    def rebuild_lexical_index(self, batch_size=1000):
+        """Populate the keyword index from chunks already stored in Chroma"""
+        copied = 0
+        offset = 0
+        while True:
+            results = self.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            ids = results.get('ids') or []
+            if not ids:
+                break
+            
+            for document, metadata in zip(results['documents'], results['metadatas']):
+                self.lexical.add_chunks(
+                    metadata['file_id'],
+                    metadata.get('filename'),
+                    [document],
+                    start_index=metadata.get('chunk', 0)
                 )
+            copied += len(ids)
+            offset += len(ids)
         
-        return f"file_{file_id}"
+        return copied
+    
+    def count(self):
+        """Number of chunks currently stored"""
+        return self.collection.count()
     
     def _chunk_text(self, text, chunk_size=1000, overlap=200):
         """Split text into overlapping chunks"""
@@ -95,6 +320,14 @@ class VectorService:
         if not file_ids:
             return "No content available"
         
+        # Lexical store first: plain SQLite reads, spread across every file
+        try:
+            overview = self.lexical.get_overview(file_ids, limit=5)
+            if overview:
+                return "\n\n".join(overview)
+        except Exception as e:
+            print(f"Error reading lexical index: {e}")
+        
         try:
             results = self.collection.get(
                 where={"file_id": {"$in": file_ids}},
@@ -108,24 +341,163 @@ class VectorService:
         
         return "No content available"
     
-    def query_relevant_content(self, queries, file_ids, n_results=5):
-        """Query vector DB for relevant content"""
+    def query_relevant_content(self, queries, file_ids, n_results=5, max_chars=6000, diversity=0.3, module_id=None):
+        """Query vector DB for relevant content.
+        
+        Each query (e.g. one per learning objective) is searched separately,
+        both by embedding in a single batched call and by BM25 keyword match.
+        The ranked lists are fused with reciprocal rank fusion and merged with
+        maximal marginal relevance so overlapping chunks are dropped and the
+        result stays under max_chars. If the vector search fails the keyword
+        hits are used on their own.
+        
+        Passing module_id enables the shared retrieval cache for the call.
+        """
         if not queries or not file_ids:
             return ""
         
-        # Combine queries into one search
-        combined_query = " ".join(queries) if isinstance(queries, list) else queries
+        query_texts = queries if isinstance(queries, list) else [queries]
+        query_texts = [q for q in query_texts if q and q.strip()]
+        if not query_texts:
+            return ""
+        
+        cache_key = None
+        if module_id is not None:
+            cache_key = self._cache_key(module_id, file_ids, query_texts, n_results, max_chars, diversity)
+            if cache_key is not None:
+                cached = retrieval_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+        
+        context = self._hybrid_query(query_texts, file_ids, n_results, max_chars, diversity)
+        if cache_key is not None and context:
+            retrieval_cache.put(cache_key, context)
+        return context
+    
+    def _cache_key(self, module_id, file_ids, query_texts, *params):
+        from models import Module, db
+        try:
+            index_version = db.session.query(Module.index_version).filter_by(id=module_id).scalar()
+        except Exception as e:
+            print(f"Could not read index version for module {module_id}: {e}")
+            return None
+        return retrieval_cache.make_key(module_id, index_version, file_ids, query_texts, *params)
+    
+    def _hybrid_query(self, query_texts, file_ids, n_results, max_chars, diversity):
+        ranked_lists = []
+        candidates = {}
+        vector_ok = True
         
         try:
             results = self.collection.query(
-                query_texts=[combined_query],
+                query_texts=query_texts,
                 where={"file_id": {"$in": file_ids}},
-                n_results=n_results
+                n_results=n_results,
+                include=["documents", "embeddings"]
             )
-            
-            if results and results['documents']:
-                return "\n\n".join(results['documents'][0])
-            return ""
+            for query_idx, ids in enumerate(results['ids']):
+                ranked_lists.append(ids)
+                for rank, chunk_id in enumerate(ids):
+                    candidates.setdefault(chunk_id, {
+                        'id': chunk_id,
+                        'document': results['documents'][query_idx][rank],
+                        'embedding': results['embeddings'][query_idx][rank]
+                    })
         except Exception as e:
             print(f"Query error: {e}")
-            return self.get_files_context(file_ids)
+            vector_ok = False
+        
+        for query in query_texts:
+            try:
+                hits = self.lexical.search(query, file_ids, limit=n_results)
+            except Exception as e:
+                print(f"Lexical query error: {e}")
+                hits = []
+            ranked_lists.append([hit['id'] for hit in hits])
+            for hit in hits:
+                candidates.setdefault(hit['id'], {
+                    'id': hit['id'],
+                    'document': hit['document'],
+                    'embedding': None
+                })
+        
+        if not candidates:
+            return "" if vector_ok else self.get_files_context(file_ids)
+        
+        if vector_ok:
+            self._load_missing_embeddings(candidates)
+        
+        scores = self._reciprocal_rank_fusion(ranked_lists)
+        top_score = max(scores.values())
+        for chunk_id, candidate in candidates.items():
+            candidate['relevance'] = scores.get(chunk_id, 0.0) / top_score
+        
+        selected = self._mmr_select(list(candidates.values()), max_chars, diversity)
+        return "\n\n".join(candidate['document'] for candidate in selected)
+    
+    def _reciprocal_rank_fusion(self, ranked_lists, k=60):
+        """Combine several rankings: each list contributes 1 / (k + rank)"""
+        scores = {}
+        for ranked in ranked_lists:
+            for rank, chunk_id in enumerate(ranked):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+        return scores
+    
+    def _load_missing_embeddings(self, candidates):
+        """Fetch stored embeddings for keyword-only hits (no model call)"""
+        missing = [chunk_id for chunk_id, candidate in candidates.items() if candidate['embedding'] is None]
+        if not missing:
+            return
+        
+        try:
+            results = self.collection.get(ids=missing, include=["embeddings"])
+            for chunk_id, embedding in zip(results['ids'], results['embeddings']):
+                candidates[chunk_id]['embedding'] = embedding
+        except Exception as e:
+            print(f"Could not load embeddings for keyword hits: {e}")
+    
+    def _mmr_select(self, candidates, max_chars, diversity=0.3, duplicate_threshold=0.95):
+        """Pick chunks by maximal marginal relevance under a character budget"""
+        selected = []
+        remaining = list(candidates)
+        used_chars = 0
+        
+        for candidate in remaining:
+            if candidate['embedding'] is None:
+                candidate['unit'] = None
+                continue
+            embedding = np.asarray(candidate['embedding'], dtype=float)
+            norm = np.linalg.norm(embedding)
+            candidate['unit'] = embedding / norm if norm else embedding
+        
+        while remaining:
+            best = None
+            best_score = None
+            best_similarity = 0.0
+            
+            for candidate in remaining:
+                similarity = max(
+                    (self._similarity(candidate, chosen) for chosen in selected),
+                    default=0.0
+                )
+                score = (1 - diversity) * candidate['relevance'] - diversity * similarity
+                if best_score is None or score > best_score:
+                    best, best_score, best_similarity = candidate, score, similarity
+            
+            remaining.remove(best)
+            
+            # Near-identical chunks (e.g. the overlapping tail of a neighbour) add nothing
+            if best_similarity >= duplicate_threshold:
+                continue
+            if used_chars + len(best['document']) > max_chars:
+                continue
+            
+            selected.append(best)
+            used_chars += len(best['document'])
+        
+        return selected
+    
+    def _similarity(self, a, b):
+        if a['unit'] is None or b['unit'] is None:
+            return 0.0
+        return float(np.dot(a['unit'], b['unit']))
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import shutil
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+
+def storage_filename(name):
+    """secure_filename() that keeps the extension of the original name.
+    
+    secure_filename drops non-ASCII characters ('лекция.pdf' becomes 'pdf'),
+    so the extension is taken from the original and an empty stem is
+    replaced with a random one.
+    """
+    base = name.replace('\\', '/').rsplit('/', 1)[-1]
+    stem, ext = base.rsplit('.', 1) if '.' in base else (base, '')
+    stem = secure_filename(stem) or uuid.uuid4().hex[:12]
+    ext = secure_filename(ext).lower()
+    return f"{stem}.{ext}" if ext else stem
+
+class ZipLimitError(Exception):
+    """Raised when an archive exceeds the configured size or ratio limits"""
+    pass
+
+class ZipIngester:
+    """Stream allowed members of a zip archive into per-upload storage.
+    
+    Members are validated from the central directory, then decompressed and
+    written by a small thread pool while the rest of the archive is still
+    being read. Sizes are enforced on the bytes actually produced, so a
+    member whose header lies about its size is rejected as well.
+    """
+    
+    def __init__(self, upload_folder, allowed_extensions, max_total_bytes=2 * 1024 ** 3,
+                 max_member_bytes=500 * 1024 ** 2, max_ratio=100, max_members=2000, workers=4):
+        self.upload_folder = upload_folder
+        self.allowed_extensions = set(allowed_extensions) - {'zip'}
+        self.max_total_bytes = max_total_bytes
+        self.max_member_bytes = max_member_bytes
+        self.max_ratio = max_ratio
+        self.max_members = max_members
+        self.workers = workers
+    
+    def ingest(self, fileobj):
+        """Yield (filename, path, file_type) for each member as soon as it is written.
+        
+        fileobj can be any seekable file object, e.g. an upload's stream, so the
+        archive itself never has to be saved next to its contents.
+        """
+        dest_folder = os.path.join(self.upload_folder, uuid.uuid4().hex[:12])
+        os.makedirs(dest_folder, exist_ok=True)
+        
+        try:
+            with zipfile.ZipFile(fileobj) as zip_ref:
+                members = self._plan(zip_ref.infolist(), dest_folder)
+                
+                pending = deque()
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    for info, target in members:
+                        pending.append(executor.submit(self._extract_member, zip_ref, info, target))
+                        if len(pending) >= self.workers * 2:
+                            yield pending.popleft().result()
+                    
+                    while pending:
+                        yield pending.popleft().result()
+        except Exception:
+            # A rejected archive keeps none of its members
+            shutil.rmtree(dest_folder, ignore_errors=True)
+            raise
+    
+    def _plan(self, infos, dest_folder):
+        """Validate headers and choose a unique target path for each allowed member"""
+        members = []
+        used_paths = set()
+        total_bytes = 0
+        
+        for info in infos:
+            if info.is_dir():
+                continue
+            
+            name = os.path.basename(info.filename)
+            if '.' not in name or name.rsplit('.', 1)[1].lower() not in self.allowed_extensions:
+                continue
+            
+            if len(members) >= self.max_members:
+                raise ZipLimitError(f"Archive has more than {self.max_members} files")
+            if info.file_size > self.max_member_bytes:
+                raise ZipLimitError(f"{name} exceeds the per-file limit")
+            if info.file_size / max(info.compress_size, 1) > self.max_ratio:
+                raise ZipLimitError(f"{name} has a suspicious compression ratio")
+            
+            total_bytes += info.file_size
+            if total_bytes > self.max_total_bytes:
+                raise ZipLimitError("Archive exceeds the total uncompressed size limit")
+            
+            target = self._target_path(info.filename, dest_folder, used_paths)
+            used_paths.add(target)
+            members.append((info, target))
+        
+        return members
+    
+    def _target_path(self, member_name, dest_folder, used_paths):
+        """Keep the archive's folder layout (sanitised) so equal names don't collide"""
+        *folders, name = member_name.replace('\\', '/').split('/')
+        parts = [secure_filename(part) for part in folders]
+        parts = [part for part in parts if part] + [storage_filename(name)]
+        target = os.path.join(dest_folder, *parts)
+        
+        base, ext = os.path.splitext(target)
+        counter = 1
+        while target in used_paths:
+            target = f"{base}_{counter}{ext}"
+            counter += 1
+        return target
+    
+    def _extract_member(self, zip_ref, info, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        
+        written = 0
+        try:
+            with zip_ref.open(info) as src, open(target, 'wb') as dst:
+                while True:
+                    block = src.read(1024 * 1024)
+                    if not block:
+                        break
+                    written += len(block)
+                    if written > info.file_size:
+                        raise ZipLimitError(f"{info.filename} is larger than its header declares")
+                    dst.write(block)
+        except Exception:
+            if os.path.exists(target):
+                os.remove(target)
+            raise
+        
+        filename = os.path.basename(target)
+        return filename, target, filename.rsplit('.', 1)[1].lower()
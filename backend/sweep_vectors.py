@@ -0,0 +1,36 @@
+"""
+Script to reconcile the vector database with the File table.
+Chunks belonging to files that no longer exist are deleted, and with
+--compact the collection is rebuilt so the index only holds live data.
+Use --rebuild-lexical to fill the keyword index from existing chunks.
+"""
+import sys
+from app import create_app
+from models import File, db
+from services.vector_service import VectorService
+
+def sweep_vectors(compact=False, rebuild_lexical=False):
+    app = create_app()
+    
+    with app.app_context():
+        vector_service = VectorService()
+        live_file_ids = [row[0] for row in db.session.query(File.id).all()]
+        
+        print(f"🔍 Sweeping vector database ({vector_service.count()} chunks, {len(live_file_ids)} live files)...")
+        removed = vector_service.sweep_orphans(live_file_ids)
+        print(f"   ✓ Removed {removed} orphaned chunks")
+        
+        if compact:
+            print("🗜️  Compacting collection...")
+            kept = vector_service.compact()
+            print(f"   ✓ Collection rebuilt with {kept} chunks")
+        
+        if rebuild_lexical:
+            print("🔤 Rebuilding keyword index...")
+            copied = vector_service.rebuild_lexical_index()
+            print(f"   ✓ Indexed {copied} chunks")
+        
+        print("\n✅ Sweep completed!")
+
+if __name__ == '__main__':
+    sweep_vectors(compact='--compact' in sys.argv, rebuild_lexical='--rebuild-lexical' in sys.argv)
@@ -0,0 +1,24 @@
+"""
+Shared fixtures for the backend tests.
+Run from the backend directory with: python -m pytest tests
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Uploads, progress files and the database all live in a throwaway folder
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('RUN_JOB_WORKERS', 'false')
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    from models import db
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,69 @@
+"""
+Query-count regression test for GET /api/modules/<id>.
+Run from the backend directory with: python -m pytest tests
+"""
+from sqlalchemy import event
+
+def seed_module(app, lesson_count):
+    from models import User, Module, Lesson, LearningObjective, LessonProgress, db
+    from flask_jwt_extended import create_access_token
+    
+    with app.app_context():
+        user = User(username=f'user{lesson_count}')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.flush()
+        
+        module = Module(name='Physics', user_id=user.id, processing_status='completed')
+        db.session.add(module)
+        db.session.flush()
+        
+        for number in range(1, lesson_count + 1):
+            lesson = Lesson(title=f'Lesson {number}', module_id=module.id, lesson_number=number)
+            db.session.add(lesson)
+            db.session.flush()
+            for order in range(3):
+                db.session.add(LearningObjective(lesson_id=lesson.id, objective_text=f'Objective {order}', order=order))
+            if number % 2:
+                db.session.add(LessonProgress(lesson_id=lesson.id, user_id=user.id, progress_percentage=50.0))
+        db.session.commit()
+        
+        return module.id, create_access_token(identity=str(user.id))
+
+def count_queries(app, client, url, token):
+    from models import db
+    statements = []
+    
+    with app.app_context():
+        engine = db.engine
+    
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers={'Authorization': f'Bearer {token}'})
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+def test_module_detail_query_count_is_constant(app):
+    client = app.test_client()
+    
+    small_id, small_token = seed_module(app, 2)
+    large_id, large_token = seed_module(app, 40)
+    
+    small_queries, small = count_queries(app, client, f'/api/modules/{small_id}', small_token)
+    large_queries, large = count_queries(app, client, f'/api/modules/{large_id}', large_token)
+    
+    # module, lessons, objectives, progress
+    assert small_queries <= 4
+    assert large_queries == small_queries
+    
+    assert [lesson['lesson_number'] for lesson in large['lessons']] == list(range(1, 41))
+    assert large['lessons'][0]['objectives'] == ['Objective 0', 'Objective 1', 'Objective 2']
+    assert large['lessons'][0]['progress_percentage'] == 50.0
+    assert large['lessons'][1]['progress_percentage'] == 0.0
+    assert large['lessons'][1]['completed'] is False
@@ -0,0 +1,91 @@
+"""
+Malformed telemetry must be rejected or dropped without blocking other events.
+Run from the backend directory with: python -m pytest tests
+"""
+import json
+import os
+import pytest
+
+def seed_lesson(app):
+    from models import User, Module, Lesson, db
+    from flask_jwt_extended import create_access_token
+    
+    with app.app_context():
+        user = User(username='learner')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.flush()
+        module = Module(name='Physics', user_id=user.id, processing_status='completed')
+        db.session.add(module)
+        db.session.flush()
+        lesson = Lesson(title='Lesson 1', module_id=module.id, lesson_number=1)
+        db.session.add(lesson)
+        db.session.commit()
+        return user.id, lesson.id, create_access_token(identity=str(user.id))
+
+def test_malformed_events_do_not_block_the_buffer(app):
+    from models import Telemetry
+    from services.telemetry_buffer import telemetry_buffer
+    
+    user_id, lesson_id, token = seed_lesson(app)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    
+    for bad in ({'lesson_id': [1], 'event_type': 'x'},
+                {'lesson_id': lesson_id, 'event_type': 5},
+                {'lesson_id': lesson_id, 'event_type': 'x', 'component_id': 'abc'}):
+        assert client.post('/api/telemetry/track', json=bad, headers=headers).status_code == 400
+    assert client.post('/api/telemetry/track', json={'lesson_id': lesson_id, 'event_type': 'card_flip'}, headers=headers).status_code == 201
+    
+    with app.app_context():
+        # A row the driver cannot bind is dropped on flush; the good ones still land
+        telemetry_buffer.add(user_id=user_id, lesson_id=[1], event_type='x')
+        telemetry_buffer.add(user_id=user_id, lesson_id=lesson_id, event_type='card_flip')
+        telemetry_buffer.flush()
+        assert Telemetry.query.count() == 2
+        
+        # Same for a spill file left by a dead process
+        owner = 'dead-00000000'
+        open(os.path.join(telemetry_buffer.folder, f'telemetry-{owner}.lock'), 'w').close()
+        with open(os.path.join(telemetry_buffer.folder, f'telemetry-{owner}-000001.jsonl'), 'w') as f:
+            for row_lesson in ([1], lesson_id):
+                f.write(json.dumps({'user_id': user_id, 'lesson_id': row_lesson, 'component_id': None,
+                                    'event_type': 'card_flip', 'event_data': '{}',
+                                    'timestamp': '2026-01-01T00:00:00'}) + '\n')
+        telemetry_buffer.replay()
+        assert Telemetry.query.count() == 3
+
+def test_failed_batch_is_not_inserted_twice(app, monkeypatch):
+    from models import Telemetry, TelemetryAggregate
+    from services.telemetry_buffer import telemetry_buffer
+    from sqlalchemy.exc import OperationalError
+    from datetime import datetime
+    
+    user_id, lesson_id, token = seed_lesson(app)
+    event_data = json.dumps({'component_type': 'quiz', 'time_seconds': 10})
+    rows = [{'user_id': user_id, 'lesson_id': row_lesson, 'component_id': None, 'event_type': 'time_spent',
+             'event_data': event_data, 'timestamp': datetime.utcnow()} for row_lesson in (lesson_id, 999999, lesson_id)]
+    
+    with app.app_context():
+        # The batch fails on the missing lesson, then the database goes away before the retry
+        insert_batch = telemetry_buffer._insert_batch
+        calls = []
+        
+        def failing_insert_batch(batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise OperationalError('INSERT', {}, Exception('database is locked'))
+            return insert_batch(batch)
+        
+        monkeypatch.setattr(telemetry_buffer, '_insert_batch', failing_insert_batch)
+        with pytest.raises(OperationalError):
+            telemetry_buffer._insert(rows)
+        assert calls == [3, 2]
+        assert Telemetry.query.count() == 0
+        
+        # flush() re-queues the whole batch after such a failure; the next attempt stores it once
+        monkeypatch.undo()
+        telemetry_buffer._insert(rows)
+        assert Telemetry.query.count() == 2
+        aggregate = TelemetryAggregate.query.filter_by(user_id=user_id, component_type='quiz').one()
+        assert (aggregate.interactions, aggregate.time_seconds) == (2, 20.0)
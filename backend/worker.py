@@ -0,0 +1,65 @@
+"""
+Background worker process for queued jobs (module processing, vector cleanup,
+periodic maintenance such as expiring abandoned uploads).
+Run one or more of these next to the web server and start the web server with
+RUN_JOB_WORKERS=false so it only serves requests. With RUN_JOB_WORKERS=false
+and no worker running, uploads stay queued and deleted modules are never purged.
+
+    python worker.py                    # JOB_WORKERS threads
+    python worker.py --concurrency 4    # override thread count
+    python worker.py --grace 60         # seconds to let running jobs finish on shutdown
+
+Several worker processes can share one database; each job is claimed by
+exactly one of them. On SIGTERM/SIGINT the worker stops claiming, waits for
+running jobs up to the grace period and hands any unfinished job back to the
+queue so another worker resumes it from its last checkpoint.
+"""
+import argparse
+import os
+import signal
+import threading
+from app import create_app
+from services.job_queue import WorkerPool
+
+def run_worker(concurrency=None, poll_interval=None, grace=30):
+    app = create_app()
+    pool = WorkerPool(
+        app,
+        concurrency or app.config['JOB_WORKERS'],
+        poll_interval or app.config['JOB_POLL_INTERVAL']
+    )
+    
+    shutdown = threading.Event()
+    
+    def handle_signal(signum, frame):
+        print(f"\n🛑 Received {signal.Signals(signum).name}, shutting down worker {os.getpid()}...")
+        shutdown.set()
+    
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    
+    from routes.modules import resume_interrupted_modules
+    resume_interrupted_modules(app)
+    
+    print(f"👷 Worker {os.getpid()} started")
+    pool.start()
+    
+    while not shutdown.wait(1):
+        pass
+    
+    if pool.stop(timeout=grace):
+        print("✓ All running jobs finished")
+    else:
+        released = pool.release_in_flight()
+        print(f"⚠️ Grace period over, released {released} unfinished jobs")
+    
+    print(f"✅ Worker {os.getpid()} stopped")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run background jobs')
+    parser.add_argument('--concurrency', type=int, help='Worker threads (default: JOB_WORKERS)')
+    parser.add_argument('--poll-interval', type=float, help='Seconds between polls when the queue is empty')
+    parser.add_argument('--grace', type=float, default=30, help='Seconds to wait for running jobs on shutdown')
+    args = parser.parse_args()
+    
+    run_worker(args.concurrency, args.poll_interval, args.grace)
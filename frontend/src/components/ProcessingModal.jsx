@@ -11,30 +11,94 @@ function ProcessingModal({ moduleId, onComplete }) {
   useEffect(() => {
     if (!moduleId) return
 
+    let finished = false
+    let interval = null
+    let source = null
+
+    const handleStatus = (data) => {
+      setStatus(data)
+
+      if (finished) return
+      if (data.processing_status === 'completed') {
+        finished = true
+        setTimeout(() => {
+          onComplete()
+        }, 2000)
+      } else if (data.processing_status === 'error') {
+        finished = true
+        setTimeout(() => {
+          onComplete()
+        }, 3000)
+      }
+
+      if (finished) {
+        if (source) source.close()
+        if (interval) clearInterval(interval)
+      }
+    }
+
     const pollStatus = async () => {
       try {
         const response = await api.get(`/modules/${moduleId}/status`)
-        setStatus(response.data)
-
-        if (response.data.processing_status === 'completed') {
-          setTimeout(() => {
-            onComplete()
-          }, 2000)
-        } else if (response.data.processing_status === 'error') {
-          setTimeout(() => {
-            onComplete()
-          }, 3000)
-        }
+        handleStatus(response.data)
       } catch (error) {
         console.error('Error fetching status:', error)
       }
     }
 
-    // Poll every 500ms for faster updates
-    const interval = setInterval(pollStatus, 500)
-    pollStatus() // Initial call
+    // Fallback for browsers/proxies where the event stream can't be opened
+    const startPolling = () => {
+      if (interval || finished) return
+      interval = setInterval(pollStatus, 2000)
+      pollStatus()
+    }
+
+    let cancelled = false
+    let reopens = 0
+
+    // The stream gets a short-lived token of its own rather than the access token,
+    // which would otherwise end up in the URL (and in server and proxy logs)
+    const openStream = async () => {
+      let streamToken
+      try {
+        const response = await api.post(`/modules/${moduleId}/events/token`)
+        streamToken = response.data.token
+      } catch (error) {
+        console.error('Error opening progress stream:', error)
+        startPolling()
+        return
+      }
+      if (cancelled || finished) return
+
+      // The server pushes a message only when the step or progress changes.
+      // EventSource reconnects on its own and sends Last-Event-ID.
+      source = new EventSource(`/api/modules/${moduleId}/events?token=${encodeURIComponent(streamToken)}`)
+      source.onmessage = (event) => handleStatus(JSON.parse(event.data))
+      source.onerror = () => {
+        // CLOSED means the browser gave up (e.g. the stream token expired); CONNECTING is a normal retry
+        if (source.readyState === EventSource.CLOSED && !finished) {
+          source.close()
+          if (reopens < 3) {
+            reopens += 1
+            openStream()
+          } else {
+            startPolling()
+          }
+        }
+      }
+    }
+
+    if (window.EventSource) {
+      openStream()
+    } else {
+      startPolling()
+    }
 
-    return () => clearInterval(interval)
+    return () => {
+      cancelled = true
+      if (source) source.close()
+      if (interval) clearInterval(interval)
+    }
   }, [moduleId, onComplete])
 
   const getStatusColor = () => {
@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react'
 import { Link, useParams } from 'react-router-dom'
 import api from '../api'
+import { trackEvent, flushTelemetry } from '../telemetry'
 import InfoCard from '../components/InfoCard'
 import FlashCard from '../components/FlashCard'
 import Quiz from '../components/Quiz'
@@ -37,6 +38,10 @@ function Lesson({ onLogout }) {
     setModuleId(null)
     setComponentCompletionStatus({})
     fetchLesson()
+    // Send buffered events when leaving the lesson
+    return () => {
+      flushTelemetry()
+    }
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [lessonId])
 
@@ -120,17 +125,14 @@ function Lesson({ onLogout }) {
     }
   }
 
-  const trackTelemetry = async (eventType, eventData) => {
-    try {
-      await api.post('/telemetry/track', {
-        lesson_id: Number.parseInt(lessonId),
-        component_id: lesson.components[currentComponentIndex]?.id,
-        event_type: eventType,
-        event_data: eventData
-      })
-    } catch (error) {
-      console.error('Error tracking telemetry:', error)
-    }
+  // Buffered; see telemetry.js
+  const trackTelemetry = (eventType, eventData) => {
+    trackEvent(
+      Number.parseInt(lessonId),
+      lesson.components[currentComponentIndex]?.id,
+      eventType,
+      eventData
+    )
   }
 
   const markComponentComplete = (componentIndex) => {
@@ -154,10 +156,12 @@ function Lesson({ onLogout }) {
   const handleNext = async () => {
     // Track time spent on current component
     const timeSpent = (Date.now() - startTime) / 1000
-    await trackTelemetry('time_spent', {
+    trackTelemetry('time_spent', {
       component_type: lesson.components[currentComponentIndex]?.type,
       time_seconds: timeSpent
     })
+    // The objective evaluation below reads telemetry, so it must be stored first
+    await flushTelemetry()
 
     // Move to next component
     const nextIndex = currentComponentIndex + 1
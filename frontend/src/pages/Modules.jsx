@@ -6,6 +6,8 @@ import EmojiPicker from '../components/EmojiPicker'
 
 function Modules({ onLogout }) {
   const [modules, setModules] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [loading, setLoading] = useState(true)
   const [showModal, setShowModal] = useState(false)
   const [editingModule, setEditingModule] = useState(null)
@@ -23,6 +25,7 @@ function Modules({ onLogout }) {
     try {
       const response = await api.get('/modules/')
       setModules(response.data)
+      setNextCursor(response.headers['x-next-cursor'] || null)
     } catch (error) {
       console.error('Error fetching modules:', error)
     } finally {
@@ -30,6 +33,20 @@ function Modules({ onLogout }) {
     }
   }
 
+  const loadMoreModules = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const response = await api.get('/modules/', { params: { cursor: nextCursor } })
+      setModules((current) => [...current, ...response.data])
+      setNextCursor(response.headers['x-next-cursor'] || null)
+    } catch (error) {
+      console.error('Error fetching modules:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleCreateModule = async (e) => {
     e.preventDefault()
     setUploading(true)
@@ -187,6 +204,14 @@ function Modules({ onLogout }) {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="flex justify-center mt-8">
+            <button onClick={loadMoreModules} className="btn btn-outline" disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Modal */}
@@ -0,0 +1,75 @@
+import api from './api'
+
+// Events are buffered and sent to /api/telemetry/batch together instead of
+// one request (and one database commit) each.
+const FLUSH_INTERVAL_MS = 10000
+const MAX_BATCH = 50
+const MAX_BUFFERED = 500 // Oldest events are dropped past this while the server is unreachable
+
+let buffer = []
+let flushing = null
+
+export function trackEvent(lessonId, componentId, eventType, eventData) {
+  buffer.push({
+    lesson_id: lessonId,
+    component_id: componentId,
+    event_type: eventType,
+    event_data: eventData,
+    client_timestamp: new Date().toISOString()
+  })
+  if (buffer.length >= MAX_BATCH) {
+    flushTelemetry()
+  }
+}
+
+// Send everything buffered; resolves once the server has stored it
+export async function flushTelemetry() {
+  // Wait for flushes already in flight, then send what arrived meanwhile
+  while (flushing) {
+    await flushing
+  }
+  if (buffer.length === 0) return
+
+  const events = buffer
+  buffer = []
+  flushing = api.post('/telemetry/batch', { events })
+    .catch((error) => {
+      console.error('Error sending telemetry batch:', error)
+      buffer = [...events, ...buffer].slice(-MAX_BUFFERED)
+    })
+    .finally(() => {
+      flushing = null
+    })
+  await flushing
+}
+
+// The page may be closing: a keepalive request survives unload like sendBeacon,
+// but unlike sendBeacon it can carry the Authorization header
+function flushOnExit() {
+  if (buffer.length === 0) return
+  const token = localStorage.getItem('token')
+  if (!token) return
+
+  const events = buffer
+  buffer = []
+  fetch('/api/telemetry/batch', {
+    method: 'POST',
+    keepalive: true,
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${token}`
+    },
+    body: JSON.stringify({ events })
+  }).catch(() => {
+    buffer = [...events, ...buffer].slice(-MAX_BUFFERED)
+  })
+}
+
+setInterval(flushTelemetry, FLUSH_INTERVAL_MS)
+
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'hidden') {
+    flushOnExit()
+  }
+})
+window.addEventListener('pagehide', flushOnExit)